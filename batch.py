@@ -0,0 +1,138 @@
+#!/usr/bin/python3
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pipeline
+from mergecore import log
+
+# Files copied out of a job workspace when it is discarded
+RESULT_FILES = (pipeline.TRANSCRIPT_FILE, pipeline.SUMMARY_FILE)
+
+def read_urls(url_file=None, playlist=None):
+    """Collect job URLs from a file (one per line, # for comments) and/or a YouTube playlist."""
+    urls = []
+    if url_file:
+        with open(url_file, 'r') as file:
+            urls.extend(line.strip() for line in file if line.strip() and not line.lstrip().startswith('#'))
+    if playlist:
+        from pytube import Playlist
+        urls.extend(Playlist(playlist).video_urls)
+    # Drop duplicates but keep the order
+    return list(dict.fromkeys(urls))
+
+def job_name(index, url):
+    """Stable workspace name for a job."""
+    return f"{index:04d}-{hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]}"
+
+def run_job(url, workspace, options, results_dir=None, stream=False, force=False):
+    """
+    Run the pipeline for one URL inside its own workspace directory.
+
+    Runs in a worker process, so changing the working directory only affects this job.
+    When results_dir is given, the transcript and summary are copied there and the
+    workspace is removed.
+
+    Returns:
+    - dict: Manifest entry for the job.
+    """
+    started = time.time()
+    entry = {'url': url, 'workspace': workspace, 'status': 'ok', 'error': None}
+    name = os.path.basename(workspace)
+    options = dict(options, metrics_labels={'job': name})
+    if options.get('prometheus_file'):
+        # One textfile per job, since every job runs in its own process
+        root, ext = os.path.splitext(options['prometheus_file'])
+        options['prometheus_file'] = f"{root}.{name}{ext}"
+    os.makedirs(workspace, exist_ok=True)
+    os.chdir(workspace)
+    try:
+        pipeline.run_job(options, force=force, stream=stream)
+    except (Exception, SystemExit) as e:
+        entry['status'] = 'failed'
+        entry['error'] = f"{type(e).__name__}: {e}"
+        log(f"Job {url} failed: {traceback.format_exc()}")
+
+    output_dir = workspace
+    if results_dir:
+        output_dir = os.path.join(results_dir, os.path.basename(workspace))
+        os.makedirs(output_dir, exist_ok=True)
+        for name in RESULT_FILES:
+            if os.path.isfile(name):
+                shutil.copy(name, os.path.join(output_dir, name))
+        os.chdir(results_dir)
+        shutil.rmtree(workspace, ignore_errors=True)
+        entry['workspace'] = None
+
+    for name in RESULT_FILES:
+        path = os.path.join(output_dir, name)
+        entry[os.path.splitext(name)[0]] = path if os.path.isfile(path) else None
+    entry['seconds'] = round(time.time() - started, 3)
+    return entry
+
+def run_batch(urls, options, workspace_root, workers=2, results_dir=None, stream=False, force=False, manifest_path='batch_manifest.json'):
+    """
+    Run many jobs through a process pool, one isolated workspace per job.
+
+    Returns:
+    - list: Manifest entries in the order of urls, also written to manifest_path.
+    """
+    workspace_root = os.path.abspath(workspace_root)
+    results_dir = os.path.abspath(results_dir) if results_dir else None
+    manifest_path = os.path.abspath(manifest_path)
+    entries = [None] * len(urls)
+
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {}
+        for index, url in enumerate(urls):
+            workspace = os.path.join(workspace_root, job_name(index, url))
+            futures[executor.submit(run_job, url, workspace, dict(options, url=url), results_dir, stream, force)] = index
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                entries[index] = future.result()
+            except Exception as e:
+                entries[index] = {'url': urls[index], 'status': 'failed', 'error': f"{type(e).__name__}: {e}"}
+            log(f"Job {index + 1}/{len(urls)} {entries[index]['status']}: {urls[index]}")
+            # Rewrite the manifest as jobs finish so a crash keeps the finished entries
+            with open(manifest_path, 'w') as manifest:
+                json.dump([entry for entry in entries if entry], manifest, indent=2)
+
+    with open(manifest_path, 'w') as manifest:
+        json.dump(entries, manifest, indent=2)
+    return entries
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the pipeline for many videos in parallel, each in its own workspace.')
+    parser.add_argument('-u', '--urls', dest='url_file', help='File with one YouTube URL per line.')
+    parser.add_argument('-p', '--playlist', help='URL of a YouTube playlist to process.')
+    parser.add_argument('-w', '--workers', type=int, default=2, help='Number of jobs to run at the same time.')
+    parser.add_argument('--workspace', default='jobs', help='Directory holding one workspace per job.')
+    parser.add_argument('--tmpfs', action='store_true', help='Put the workspaces on tmpfs (/dev/shm) and keep only the results.')
+    parser.add_argument('--results', default='results', help='Directory that receives the results when --tmpfs is used.')
+    parser.add_argument('-m', '--manifest', default='batch_manifest.json', help='Aggregated manifest of all jobs.')
+    pipeline.add_stage_arguments(parser)
+    args = parser.parse_args()
+
+    urls = read_urls(args.url_file, args.playlist)
+    if not urls:
+        parser.error("no URLs given; use --urls and/or --playlist")
+
+    workspace_root = args.workspace
+    results_dir = None
+    if args.tmpfs:
+        workspace_root = os.path.join('/dev/shm', 'v2s-process', os.path.basename(os.path.abspath(args.workspace)))
+        results_dir = args.results
+
+    log(f"Processing {len(urls)} videos with {args.workers} workers...")
+    entries = run_batch(urls, pipeline.options_from_args(args, None), workspace_root, args.workers,
+                        results_dir, args.stream, args.force, args.manifest)
+    failed = sum(1 for entry in entries if entry['status'] != 'ok')
+    log(f"Batch complete: {len(entries) - failed} succeeded, {failed} failed. Manifest written to {args.manifest}.")
+
+if __name__ == '__main__':
+    main()
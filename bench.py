@@ -0,0 +1,168 @@
+#!/usr/bin/python3
+import argparse
+import gc
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from synthetic import synthetic_transcript
+
+# Where tiktoken downloads cl100k_base from; the cache file is named after its SHA-1
+ENCODING_URL = "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken"
+
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'v2s-process', 'tiktoken')
+DEFAULT_BASELINE = 'bench_baseline.json'
+MODEL = "gpt-3.5-turbo-0613"
+
+def use_encoding_cache(cache_dir=DEFAULT_CACHE_DIR, encoding_file=None):
+    """
+    Make tiktoken load its encoding from cache_dir instead of the network.
+
+    Args:
+    - cache_dir (str): Directory used as TIKTOKEN_CACHE_DIR. Run once online to fill it.
+    - encoding_file (str): A vendored cl100k_base.tiktoken file to copy into the cache.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    os.environ['TIKTOKEN_CACHE_DIR'] = cache_dir
+    if encoding_file:
+        shutil.copy(encoding_file, os.path.join(cache_dir, hashlib.sha1(ENCODING_URL.encode()).hexdigest()))
+
+def plain_transcript(words, seed=0):
+    """The diarized transcript with the speaker prefixes and line breaks removed."""
+    text = synthetic_transcript(words, seed=seed)
+    return ' '.join(line.split(': ', 1)[1] for line in text.splitlines())
+
+def diarized_transcript(words, seed=0):
+    return synthetic_transcript(words, seed=seed)
+
+FORMATS = {'diarized': diarized_transcript, 'plain': plain_transcript}
+
+def benchmarks():
+    """The functions under test, each taking (text, path) of one transcript."""
+    import chnk
+    import summarize
+    import tokencount
+    return {
+        'summarize.get_chunk': lambda text, path: summarize.get_chunk(text, 2500, MODEL),
+        'tokencount.calculate_tokens': lambda text, path: tokencount.calculate_tokens(text, MODEL),
+        'tokencount.enhanced_num_tokens_from_messages': lambda text, path: tokencount.enhanced_num_tokens_from_messages(
+            [{"role": "user", "content": text}], MODEL),
+        'chnk.chunk_text': lambda text, path: chnk.chunk_text(path, 4096, MODEL),
+    }
+
+def measure(function, text, path, repeat=3):
+    """
+    Time a call and measure its peak Python memory.
+
+    Returns:
+    - dict: Best wall-clock seconds over repeat runs, and peak traced bytes of one extra run.
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        function(text, path)
+        times.append(time.perf_counter() - started)
+
+    # Tracing slows the call down, so memory is measured in a separate run
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function(text, path)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'seconds': round(min(times), 6), 'peak_bytes': peak}
+
+def run_benchmarks(sizes, formats=FORMATS, names=None, repeat=3, workdir=None):
+    """
+    Run every benchmark on a synthetic transcript of every size and format.
+
+    Returns:
+    - dict: Results keyed by "function/format/words".
+    """
+    cases = benchmarks()
+    if names:
+        cases = {name: function for name, function in cases.items() if name in names}
+    results = {}
+    with tempfile.TemporaryDirectory(dir=workdir) as directory:
+        for words in sizes:
+            for format_name, generate in formats.items():
+                text = generate(words)
+                path = os.path.join(directory, f"{format_name}_{words}.txt")
+                with open(path, 'w') as file:
+                    file.write(text)
+                for name, function in cases.items():
+                    # Warm up, so the encoding load is not part of the first measurement
+                    function(text[:1000], path)
+                    key = f"{name}/{format_name}/{words}"
+                    results[key] = measure(function, text, path, repeat)
+                    print(f"{key:>58} {results[key]['seconds']:>10.4f}s {results[key]['peak_bytes'] / 1e6:>10.1f} MB", flush=True)
+    return results
+
+def compare(results, baseline, threshold=0.2):
+    """
+    Compare results against a baseline.
+
+    Returns:
+    - list: (key, metric, baseline, current) for every metric that grew by more than threshold.
+    """
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        for metric in ('seconds', 'peak_bytes'):
+            if previous[metric] and current[metric] > previous[metric] * (1 + threshold):
+                regressions.append((key, metric, previous[metric], current[metric]))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the tokenization and chunking hot paths on synthetic transcripts.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000], help='Transcript sizes in words.')
+    parser.add_argument('--formats', nargs='+', choices=sorted(FORMATS), default=sorted(FORMATS), help='Transcript formats.')
+    parser.add_argument('--only', nargs='+', help='Only run these functions, e.g. summarize.get_chunk.')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per case; the best one is kept.')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline file to compare against or save to.')
+    parser.add_argument('--save', action='store_true', help='Save the results as the new baseline.')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed growth over the baseline before a case is flagged (0.2 = 20%%).')
+    parser.add_argument('--encoding_cache', default=DEFAULT_CACHE_DIR, help='tiktoken cache directory, so the run works offline.')
+    parser.add_argument('--encoding_file', help='Vendored cl100k_base.tiktoken file to load into the cache.')
+    parser.add_argument('--json', dest='json_file', help='Also write the results to this JSON file.')
+    args = parser.parse_args()
+
+    use_encoding_cache(args.encoding_cache, args.encoding_file)
+    results = run_benchmarks(args.sizes, {name: FORMATS[name] for name in args.formats}, args.only, args.repeat)
+
+    if args.json_file:
+        with open(args.json_file, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.save:
+        baseline = {}
+        if os.path.isfile(args.baseline):
+            with open(args.baseline, 'r') as file:
+                baseline = json.load(file)
+        baseline.update(results)
+        with open(args.baseline, 'w') as file:
+            json.dump(baseline, file, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}.")
+        return
+
+    if not os.path.isfile(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save to create one.")
+        return
+    with open(args.baseline, 'r') as file:
+        regressions = compare(results, json.load(file), args.threshold)
+    for key, metric, previous, current in regressions:
+        print(f"REGRESSION {key} {metric}: {previous} -> {current} ({current / previous - 1:+.0%})")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions beyond {args.threshold:.0%}.")
+
+if __name__ == '__main__':
+    main()
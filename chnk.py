@@ -3,52 +3,141 @@
 import os
 import sys
 import argparse
+import functools
+import io
+import itertools
 import nltk
 import logging
+import transcriptstore
+from tokencount import AnchoredChunker, TokenChunker
 
-# Function to split text into tokens
-def tokenize(text):
-    return text.split()
+# Characters read from the input at a time
+BLOCK_SIZE = 64 * 1024
+
+@functools.lru_cache(maxsize=None)
+def get_sentence_tokenizer():
+    """Return the trained English Punkt tokenizer, or an untrained one if its data is not installed."""
+    try:
+        return nltk.tokenize.punkt.PunktTokenizer('english')
+    except (LookupError, AttributeError):
+        return nltk.tokenize.punkt.PunktSentenceTokenizer()
+
+def iter_sentences(file, block_size=BLOCK_SIZE, tokenizer=None):
+    """
+    Split text read from a file object into sentences, one block at a time.
+
+    Each sentence keeps the whitespace that follows it and utterance lines are split at
+    their newlines, so joining the pieces gives back the input exactly. The last sentence
+    of a block may be cut off, so it is carried over and re-split with the next block.
+
+    Args:
+    - file: Text file object to read from.
+    - block_size (int): Number of characters read at a time.
+    - tokenizer: Punkt tokenizer to use. Defaults to get_sentence_tokenizer().
+
+    Yields:
+    - str: The sentences in order.
+    """
+    tokenizer = tokenizer or get_sentence_tokenizer()
+    carry = ''
+    while True:
+        block = file.read(block_size)
+        text = carry + block
+        if not text:
+            return
+        starts = [start for start, _ in tokenizer.span_tokenize(text)]
+        starts[0:1] = [0]
+        pieces = [text[start:end] for start, end in zip(starts, starts[1:] + [len(text)])]
+        # Without a sentence break in sight, give up on the carry instead of letting it grow
+        if block and len(pieces[-1]) <= 4 * block_size:
+            carry = pieces.pop()
+        else:
+            carry = ''
+        for piece in pieces:
+            yield from piece.splitlines(keepends=True)
+        if not block:
+            return
+
+def iter_chunks(file_name, max_tokens=4096, model="gpt-3.5-turbo-0613", block_size=BLOCK_SIZE):
+    """
+    Lazily split a text file into chunks of at most max_tokens model tokens.
+
+    Sentences are packed into a chunk until the next one would overflow the budget, and a
+    single sentence longer than the budget is cut on token boundaries. Only the current
+    block and the chunk being filled are held in memory.
+
+    Args:
+    - file_name (str): Path of the text file.
+    - max_tokens (int): Maximum number of tokens per chunk, counted with the model's encoding.
+    - model (str): Model whose tiktoken encoding is used.
+    - block_size (int): Number of characters read at a time.
+
+    Yields:
+    - tuple: (chunk_text, token_count) for each chunk, in order.
+    """
+    if transcriptstore.is_store(file_name):
+        with transcriptstore.TranscriptStore(file_name) as store:
+            yield from iter_store_chunks(store, max_tokens, model)
+        return
+    chunker = TokenChunker(max_tokens, model)
+    with open(file_name, 'r') as file:
+        for sentence in iter_sentences(file, block_size):
+            yield from chunker.feed(sentence)
+    yield from chunker.flush()
+
+def iter_store_chunks(store, max_tokens=4096, model="gpt-3.5-turbo-0613", start_ms=None, end_ms=None, speaker=None):
+    """
+    Lazily chunk a time range or one speaker of a transcript store, like iter_chunks().
+
+    Only the utterances being chunked are read from the store.
+
+    Args:
+    - store (TranscriptStore): The open transcript store.
+    - max_tokens (int): Maximum number of tokens per chunk.
+    - model (str): Model whose tiktoken encoding is used.
+    - start_ms (int): Start of the range, or None for the beginning.
+    - end_ms (int): End of the range, or None for the end.
+    - speaker (str): Only this speaker's utterances, or None for all.
+
+    Yields:
+    - tuple: (chunk_text, token_count) for each chunk, in order.
+    """
+    chunker = TokenChunker(max_tokens, model)
+    tokenizer = get_sentence_tokenizer()
+    for line in store.iter_lines(start_ms, end_ms, speaker):
+        for sentence in iter_sentences(io.StringIO(line), tokenizer=tokenizer):
+            yield from chunker.feed(sentence)
+    yield from chunker.flush()
+
+def anchored_chunks(text, max_tokens=4096, model="gpt-3.5-turbo-0613"):
+    """
+    Split text into chunks with content-defined boundaries at sentence breaks.
+
+    Unlike iter_chunks(), a correction or an append only changes the chunks around it,
+    so their summaries can be reused (see summarize.SummaryManifest).
+
+    Returns:
+    - list: (chunk_text, token_count) for each chunk, in order.
+    """
+    chunker = AnchoredChunker(max_tokens, model)
+    chunks = []
+    for sentence in iter_sentences(io.StringIO(text)):
+        chunks.extend(chunker.feed(sentence))
+    chunks.extend(chunker.flush())
+    return chunks
 
 # Function to chunk text into smaller pieces
-def chunk_text(file_name, max_tokens=4096):
+def chunk_text(file_name, max_tokens=4096, model="gpt-3.5-turbo-0613"):
     script_dir = os.path.dirname(os.path.realpath(__file__))
     file_path = os.path.join(script_dir, file_name)
 
+    logging.info("Starting text chunking...")
     try:
-        logging.info(f"Opening the file: {file_path}")
-        with open(file_path, 'r') as file:
-            text = file.read()
+        chunks = [chunk for chunk, _ in iter_chunks(file_path, max_tokens, model)]
     except (FileNotFoundError, PermissionError) as e:
         logging.error(f"Failed to open the file. Error: {str(e)}")
         sys.exit(1)
 
-    sentences = nltk.sent_tokenize(text)
-    chunks = []
-    current_chunk = []
-
-    logging.info("Starting text chunking...")
-    try:
-        for sentence in sentences:
-            sentence_tokens = tokenize(sentence)
-            if len(sentence_tokens) > max_tokens:
-                for i in range(0, len(sentence_tokens), max_tokens):
-                    end_index = min(i + max_tokens, len(sentence_tokens))
-                    chunk = sentence_tokens[i:end_index]
-                    chunks.append(' '.join(chunk))
-            else:
-                if len(current_chunk) + len(sentence_tokens) > max_tokens:
-                    chunks.append(' '.join(current_chunk))
-                    current_chunk = sentence_tokens
-                else:
-                    current_chunk.extend(sentence_tokens)
-    except Exception as e:
-        logging.error(f"Failed during text chunking. Error: {str(e)}")
-        sys.exit(1)
-
-    if current_chunk:
-        chunks.append(' '.join(current_chunk))
-
     logging.info(f"Text chunking completed. {len(chunks)} chunks created.")
     return chunks
 
@@ -62,46 +151,59 @@ def write_chunks_to_files(chunks, output_dir):
         sys.exit(1)
 
     logging.info(f"Writing chunks to the output directory: {output_dir}")
+    count = 0
     try:
         for i, chunk in enumerate(chunks):
             with open(f"{output_dir}/chunk_{i+1}.txt", 'w') as file:
                 file.write(chunk)
+            count += 1
     except PermissionError as e:
         logging.error(f"Failed to write chunk to file. Error: {str(e)}")
         sys.exit(1)
+    return count
+
+def main():
+    # Using argparse for command line argument handling
+    parser = argparse.ArgumentParser(description='This script splits a text file into chunks of a specified size, preserving sentence boundaries where possible.')
+    parser.add_argument('file_name', help='The name of the file to chunk.')
+    parser.add_argument('--max_tokens', type=int, default=4096, help='The maximum number of tokens per chunk. Default is 4096.')
+    parser.add_argument('--model', default="gpt-3.5-turbo-0613", help='The model whose tokenizer counts the tokens.')
+    parser.add_argument('--output_dir', default=None, help='Directory for the chunk files. Defaults to the directory of the input file.')
+    parser.add_argument('--delete_file', action='store_true', help='Delete the original file after chunking.')
+    parser.add_argument('--keep_file', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--log', help='Log file to write the progress updates. If not provided, updates are printed to the console.')
+
+    args = parser.parse_args()
+
+    if args.log:
+        logging.basicConfig(filename=args.log, level=logging.INFO)
+    else:
+        logging.basicConfig(level=logging.INFO)
+
+    file_name = args.file_name
+    output_dir = args.output_dir or os.path.dirname(os.path.abspath(file_name))
+
+    logging.info(f"Starting to process the file: {file_name}")
+    try:
+        chunks = (chunk for chunk, _ in iter_chunks(file_name, args.max_tokens, args.model))
+        # Look at the first two chunks to tell whether the file needs splitting at all
+        first = list(itertools.islice(chunks, 2))
+        if len(first) < 2:
+            logging.info("No changes needed.")
+            return
+        count = write_chunks_to_files(itertools.chain(first, chunks), output_dir)
+    except (FileNotFoundError, PermissionError) as e:
+        logging.error(f"Failed to open the file. Error: {str(e)}")
+        sys.exit(1)
+    logging.info(f"Text chunking completed. {count} chunks created.")
 
-# Using argparse for command line argument handling
-parser = argparse.ArgumentParser(description='This script splits a text file into chunks of a specified size, preserving sentence boundaries where possible.')
-parser.add_argument('file_name', help='The name of the file to chunk.')
-parser.add_argument('--max_tokens', type=int, default=4096, help='The maximum number of tokens per chunk. Default is 4096.')
-parser.add_argument('--keep_file', action='store_true', help='Keep the original file after chunking.')
-parser.add_argument('--log', help='Log file to write the progress updates. If not provided, updates are printed to the console.')
-
-args = parser.parse_args()
-
-if args.log:
-    logging.basicConfig(filename=args.log, level=logging.INFO)
-else:
-    logging.basicConfig(level=logging.INFO)
-
-file_name = args.file_name
-max_tokens = args.max_tokens
-keep_file = args.keep_file
-
-script_dir = os.path.dirname(os.path.realpath(__file__))
-output_dir = script_dir
-
-logging.info(f"Starting to process the file: {file_name}")
-chunks = chunk_text(file_name, max_tokens)
-
-if len(chunks) > 1:
-    if not keep_file:
+    if args.delete_file:
         try:
             logging.info(f"Deleting the original file: {file_name}")
-            os.remove(os.path.join(script_dir, file_name))
+            os.remove(file_name)
         except PermissionError as e:
             logging.error(f"Failed to delete the original file. Error: {str(e)}")
             sys.exit(1)
-    write_chunks_to_files(chunks, output_dir)
-else:
-    logging.info("No changes needed.")
+
+if __name__ == '__main__':
+    main()
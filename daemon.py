@@ -0,0 +1,388 @@
+#!/usr/bin/python3
+import argparse
+import http.client
+import json
+import os
+import queue
+import shutil
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import assemblyai as aai
+import chnk
+import pipeline
+import summarize
+from mergecore import log
+from tokencount import get_token_counter
+
+DEFAULT_SOCKET = os.path.join(os.path.expanduser('~'), '.v2s-process.sock')
+
+# Options that name files; relative ones are resolved when the job is submitted
+PATH_OPTIONS = ('dedup_corpus', 'trace_file', 'prometheus_file')
+
+# Job states
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+
+def default_options():
+    """Stage options as pipeline.py would build them with no command-line flags."""
+    parser = argparse.ArgumentParser()
+    pipeline.add_stage_arguments(parser)
+    return pipeline.options_from_args(parser.parse_args([]), None)
+
+def warm_up(engine="gpt-3.5-turbo-0613"):
+    """Load the state every job needs once: the tiktoken encoding, the Punkt model and the API clients."""
+    started = time.perf_counter()
+    get_token_counter(engine)
+    chnk.get_sentence_tokenizer()
+    # transcribe.py has already read the key from the environment; without one there is no client to build
+    if aai.settings.api_key:
+        aai.Client.get_default()
+    log(f"Warm-up finished in {time.perf_counter() - started:.2f}s.")
+
+class Job:
+    """One request to the daemon: a YouTube URL, a local media file, or transcript text."""
+
+    def __init__(self, kind, source, options, workspace):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.source = source
+        self.options = options
+        self.workspace = os.path.join(workspace, self.id)
+        self.state = QUEUED
+        self.error = None
+        self.result = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel = threading.Event()
+
+    def describe(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'source': self.source if self.kind != 'text' else f"{len(self.source)} characters",
+            'state': self.state,
+            'error': self.error,
+            'result': self.result,
+            'workspace': self.workspace,
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+class JobQueue:
+    """
+    Runs jobs on long-lived worker threads.
+
+    URL and file jobs run the pipeline with their workspace as the working directory,
+    which is shared by the whole process, so they hold a lock and run one at a time.
+    Text jobs only summarize and can run next to them.
+    """
+
+    def __init__(self, workspace, workers=2):
+        self.workspace = os.path.abspath(workspace)
+        # Pipeline jobs change the working directory, so remember the one paths are relative to
+        self.cwd = os.getcwd()
+        self.jobs = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._cwd_lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._work, daemon=True, name=f"job-worker-{i}") for i in range(max(1, workers))]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, kind, source, options=None):
+        if kind not in ('url', 'file', 'text'):
+            raise ValueError(f"unknown job kind {kind!r}")
+        options = dict(default_options(), **(options or {}))
+        if kind == 'text' and (options.get('trace_file') or options.get('prometheus_file')):
+            # Text jobs run alongside other jobs, and span recording is process-wide
+            raise ValueError("trace_file and prometheus_file are only supported for url and file jobs")
+        for name in PATH_OPTIONS:
+            if options.get(name):
+                options[name] = os.path.join(self.cwd, os.path.expanduser(options[name]))
+        job = Job(kind, source, options, self.workspace)
+        with self._lock:
+            self.jobs[job.id] = job
+        self._queue.put(job)
+        log(f"Job {job.id} queued ({kind}).")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return [job.describe() for job in self.jobs.values()]
+
+    def cancel(self, job_id):
+        """
+        Cancel a job. A queued job never starts; a running pipeline job stops before its
+        next stage. A running text job finishes, but its result is dropped.
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.cancel.set()
+        with self._lock:
+            if job.state == QUEUED:
+                job.state = CANCELLED
+                job.finished = time.time()
+        return job
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                if job.state != QUEUED:
+                    continue
+                job.state = RUNNING
+                job.started = time.time()
+            try:
+                result = self._run(job)
+                state, error = (CANCELLED, None) if job.cancel.is_set() else (DONE, None)
+            except pipeline.Cancelled:
+                result, state, error = None, CANCELLED, None
+            except (Exception, SystemExit) as e:
+                log(f"Job {job.id} failed: {traceback.format_exc()}")
+                result, state, error = None, FAILED, f"{type(e).__name__}: {e}"
+            with self._lock:
+                job.result = result if state == DONE else None
+                job.state = state
+                job.error = error
+                job.finished = time.time()
+            log(f"Job {job.id} {state}.")
+
+    def _run(self, job):
+        os.makedirs(job.workspace, exist_ok=True)
+        if job.kind == 'text':
+            return self._run_text(job)
+
+        with self._cwd_lock:
+            previous = os.getcwd()
+            os.chdir(job.workspace)
+            try:
+                if job.kind == 'url':
+                    pipeline.run_job(dict(job.options, url=job.source), stream=job.options.get('stream', False), cancel=job.cancel)
+                else:
+                    # A local file takes the place of the download stage
+                    source = pipeline.source_file(job.options)
+                    stages = [pipeline.Stage('download', [], lambda options: [job.source], lambda options: link_source(job.source, source))]
+                    pipeline.run_job(dict(job.options, url=job.source), stream=job.options.get('stream', False), cancel=job.cancel,
+                                     stages=stages + pipeline.STAGES[1:])
+            finally:
+                os.chdir(previous)
+        return {name: os.path.join(job.workspace, name) for name in (pipeline.TRANSCRIPT_FILE, pipeline.SUMMARY_FILE)
+                if os.path.isfile(os.path.join(job.workspace, name))}
+
+    def _run_text(self, job):
+        transcript = os.path.join(job.workspace, pipeline.TRANSCRIPT_FILE)
+        output = os.path.join(job.workspace, pipeline.SUMMARY_FILE)
+        with open(transcript, 'w') as file:
+            file.write(job.source)
+        summarize.generate_summaries(input_file=transcript, output_file=output, engine=job.options['engine'],
+                                     max_tokens=pipeline.request_budget(job.options),
+                                     concurrency=job.options['summarize_concurrency'], reduce=job.options.get('reduce', False),
+                                     deduplicate=job.options.get('dedup', False), dedup_corpus=job.options.get('dedup_corpus'),
+                                     dedup_job=job.options.get('dedup_job'))
+        # generate_summaries raises on failure, so _work marks the job failed
+        with open(output, 'r') as file:
+            return {pipeline.SUMMARY_FILE: output, 'summary': file.read()}
+
+def link_source(path, name):
+    """Make a local media file available in the workspace under the name the conversion stage reads."""
+    if os.path.lexists(name):
+        os.remove(name)
+    try:
+        os.symlink(os.path.abspath(path), name)
+    except OSError:
+        shutil.copy(path, name)
+    return [name]
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """HTTP over a Unix socket, so only local users with access to the socket file can submit jobs."""
+    daemon_threads = True
+
+def make_handler(jobs):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def address_string(self):
+            return str(self.client_address[0] if self.client_address else 'unix')
+
+        def send_json(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def job_or_404(self):
+            job = jobs.get(self.path.rstrip('/').rsplit('/', 1)[1])
+            if job is None:
+                self.send_json(404, {'error': 'job not found'})
+            return job
+
+        def do_GET(self):
+            if self.path == '/health':
+                self.send_json(200, {'status': 'ok', 'jobs': len(jobs.jobs)})
+            elif self.path.rstrip('/') == '/jobs':
+                self.send_json(200, jobs.list())
+            elif self.path.startswith('/jobs/'):
+                job = self.job_or_404()
+                if job:
+                    self.send_json(200, job.describe())
+            else:
+                self.send_json(404, {'error': f'unknown path {self.path}'})
+
+        def do_POST(self):
+            if self.path.rstrip('/') != '/jobs':
+                self.send_json(404, {'error': f'unknown path {self.path}'})
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+                kinds = [kind for kind in ('url', 'file', 'text') if request.get(kind)]
+                if len(kinds) != 1:
+                    raise ValueError("give exactly one of url, file or text")
+                job = jobs.submit(kinds[0], request[kinds[0]], request.get('options'))
+            except ValueError as e:
+                self.send_json(400, {'error': str(e)})
+                return
+            self.send_json(202, job.describe())
+
+        def do_DELETE(self):
+            if not self.path.startswith('/jobs/'):
+                self.send_json(404, {'error': f'unknown path {self.path}'})
+                return
+            job = jobs.cancel(self.path.rstrip('/').rsplit('/', 1)[1])
+            if job is None:
+                self.send_json(404, {'error': 'job not found'})
+            else:
+                self.send_json(200, job.describe())
+
+    return Handler
+
+def serve(socket_path=None, host='127.0.0.1', port=None, workspace='daemon-jobs', workers=2, engine="gpt-3.5-turbo-0613"):
+    """Warm up, then accept jobs over a Unix socket (default) or a local TCP port until interrupted."""
+    warm_up(engine)
+    jobs = JobQueue(workspace, workers)
+    if port is not None:
+        server = ThreadingHTTPServer((host, port), make_handler(jobs))
+        server.daemon_threads = True
+        log(f"Daemon listening on http://{host}:{server.server_address[1]}")
+    else:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixHTTPServer(socket_path, make_handler(jobs))
+        os.chmod(socket_path, 0o600)
+        log(f"Daemon listening on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if port is None and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=60):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+def request(method, path, payload=None, socket_path=DEFAULT_SOCKET, url=None):
+    """Send one request to the daemon and return (status, decoded JSON)."""
+    if url:
+        host, _, port = url.split('://', 1)[-1].rstrip('/').partition(':')
+        connection = http.client.HTTPConnection(host, int(port or 80), timeout=60)
+    else:
+        connection = UnixHTTPConnection(socket_path)
+    try:
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        connection.request(method, path, body=body, headers={'Content-Type': 'application/json'} if body else {})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read() or b'null')
+    finally:
+        connection.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Keep the pipeline warm in a long-lived daemon and send it jobs.')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help='Unix socket the daemon listens on.')
+    parser.add_argument('--url', dest='daemon_url', help='Talk to a daemon listening on http://host:port instead of the socket.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help='Run the daemon.')
+    serve_parser.add_argument('--port', type=int, default=None, help='Listen on this local TCP port instead of the Unix socket.')
+    serve_parser.add_argument('--host', default='127.0.0.1', help='Address to bind with --port.')
+    serve_parser.add_argument('--workspace', default='daemon-jobs', help='Directory holding one workspace per job.')
+    serve_parser.add_argument('-w', '--workers', type=int, default=2, help='Jobs handled at the same time (pipeline jobs still run one at a time).')
+    serve_parser.add_argument('--engine', default="gpt-3.5-turbo-0613", help='Model whose tokenizer is loaded at start-up.')
+
+    submit_parser = commands.add_parser('submit', help='Queue a job.')
+    source = submit_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--video', help='YouTube URL to process.')
+    source.add_argument('--file', help='Local audio or video file to process.')
+    source.add_argument('--text', help='Transcript file to summarize.')
+    submit_parser.add_argument('--options', default='{}', help='JSON object of stage options, e.g. \'{"engine": "gpt-4-0613", "reduce": true}\'.')
+    submit_parser.add_argument('--wait', action='store_true', help='Wait for the job to finish and print its result.')
+
+    status_parser = commands.add_parser('status', help='Show one job, or all of them.')
+    status_parser.add_argument('job_id', nargs='?', help='Job to show.')
+
+    cancel_parser = commands.add_parser('cancel', help='Cancel a job.')
+    cancel_parser.add_argument('job_id', help='Job to cancel.')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(args.socket, args.host, args.port, args.workspace, args.workers, args.engine)
+        return
+
+    def call(method, path, payload=None):
+        status, body = request(method, path, payload, args.socket, args.daemon_url)
+        if status >= 400:
+            print(json.dumps(body, indent=2))
+            sys.exit(1)
+        return body
+
+    if args.command == 'submit':
+        if args.text:
+            with open(args.text, 'r') as file:
+                payload = {'text': file.read()}
+        elif args.file:
+            payload = {'file': os.path.abspath(args.file)}
+        else:
+            payload = {'url': args.video}
+        payload['options'] = json.loads(args.options)
+        # The daemon may run in another directory, so send file options as absolute paths
+        for name in PATH_OPTIONS:
+            if payload['options'].get(name):
+                payload['options'][name] = os.path.abspath(os.path.expanduser(payload['options'][name]))
+        job = call('POST', '/jobs', payload)
+        while args.wait and job['state'] in (QUEUED, RUNNING):
+            time.sleep(1)
+            job = call('GET', f"/jobs/{job['id']}")
+        print(json.dumps(job, indent=2))
+        if job['state'] in (FAILED, CANCELLED):
+            sys.exit(1)
+    elif args.command == 'status':
+        print(json.dumps(call('GET', f"/jobs/{args.job_id}" if args.job_id else '/jobs'), indent=2))
+    elif args.command == 'cancel':
+        print(json.dumps(call('DELETE', f"/jobs/{args.job_id}"), indent=2))
+
+if __name__ == '__main__':
+    main()
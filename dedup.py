@@ -0,0 +1,216 @@
+#!/usr/bin/python3
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+from chnk import get_sentence_tokenizer
+from mergecore import log
+from tokencount import get_token_counter
+
+# MinHash signature length, split into BANDS bands of ROWS rows for LSH
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+# Mersenne prime used by the universal hash family
+_PRIME = (1 << 61) - 1
+_rng = random.Random(1)
+# Fixed coefficients, so signatures stay comparable across runs and jobs
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+SPEAKER_PREFIX = re.compile(r'^(Speaker [^:]{1,20}: )')
+
+def normalize(text):
+    """Lower-case words without punctuation, used for shingling and exact matching."""
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+def shingles(words, size=5):
+    """Hashes of the word n-grams of a segment (the whole segment if it is shorter)."""
+    size = max(1, min(size, len(words)))
+    return {int.from_bytes(hashlib.blake2b(' '.join(words[i:i + size]).encode('utf-8'), digest_size=8).digest(), 'big')
+            for i in range(len(words) - size + 1)}
+
+def minhash(hashes):
+    """MinHash signature of a set of shingle hashes."""
+    return [min((a * value + b) % _PRIME for value in hashes) for a, b in _PERMUTATIONS]
+
+def similarity(first, second):
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(x == y for x, y in zip(first, second)) / len(first)
+
+def band_keys(signature):
+    """One LSH bucket key per band; near-duplicates share at least one with high probability."""
+    return [hashlib.blake2b(repr(signature[i * ROWS:(i + 1) * ROWS]).encode('ascii'), digest_size=8).hexdigest()
+            for i in range(BANDS)]
+
+def split_segments(text):
+    """
+    Split a transcript into utterance lines and their sentences.
+
+    Returns:
+    - list: (prefix, sentences) per line, where prefix is the "Speaker X: " label (or '').
+    """
+    tokenizer = get_sentence_tokenizer()
+    lines = []
+    for line in text.splitlines():
+        match = SPEAKER_PREFIX.match(line)
+        prefix = match.group(1) if match else ''
+        body = line[len(prefix):]
+        lines.append((prefix, [body[start:end] for start, end in tokenizer.span_tokenize(body)]))
+    return lines
+
+class BoilerplateCorpus:
+    """
+    Signatures of segments seen in earlier jobs, kept in a SQLite file.
+
+    A segment counts as boilerplate when a near-duplicate of it appeared in at least
+    min_jobs other jobs, e.g. a sponsor read or intro that a channel repeats.
+    """
+
+    def __init__(self, path, min_jobs=2):
+        self.path = path
+        self.min_jobs = min_jobs
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS segments (id INTEGER PRIMARY KEY, job TEXT NOT NULL, signature TEXT NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS bands (bucket TEXT NOT NULL, segment INTEGER NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS bands_bucket ON bands (bucket)")
+        self._conn.commit()
+
+    def is_boilerplate(self, signature, job, threshold):
+        """Check whether near-duplicates of a signature were seen in min_jobs other jobs."""
+        keys = [f"{i}:{key}" for i, key in enumerate(band_keys(signature))]
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT DISTINCT s.id, s.job, s.signature FROM bands b JOIN segments s ON s.id = b.segment "
+                f"WHERE b.bucket IN ({','.join('?' * len(keys))}) AND s.job != ?", keys + [job]).fetchall()
+        jobs = {other for _, other, stored in rows if similarity(signature, json.loads(stored)) >= threshold}
+        return len(jobs) >= self.min_jobs
+
+    def add(self, job, signatures):
+        """Record the segment signatures of a job, replacing what was stored for it before."""
+        with self._lock:
+            self._conn.execute("DELETE FROM bands WHERE segment IN (SELECT id FROM segments WHERE job = ?)", (job,))
+            self._conn.execute("DELETE FROM segments WHERE job = ?", (job,))
+            for signature in signatures:
+                cursor = self._conn.execute("INSERT INTO segments (job, signature) VALUES (?, ?)", (job, json.dumps(signature)))
+                self._conn.executemany("INSERT INTO bands (bucket, segment) VALUES (?, ?)",
+                                       [(f"{i}:{key}", cursor.lastrowid) for i, key in enumerate(band_keys(signature))])
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def deduplicate(text, threshold=0.8, min_words=8, corpus=None, job=None, model="gpt-3.5-turbo-0613"):
+    """
+    Drop repeated sentences from a transcript before it is chunked.
+
+    Exact repeats (after normalization) and near-duplicates found with MinHash/LSH keep
+    only their first occurrence. With a corpus, sentences that match boilerplate from
+    other jobs are dropped everywhere, and this transcript's sentences are added to it.
+    Sentences shorter than min_words are always kept, since short phrases repeat naturally.
+
+    Args:
+    - text (str): Transcript in the "Speaker X: text" line format.
+    - threshold (float): Estimated Jaccard similarity at which two sentences are duplicates.
+    - min_words (int): Shortest sentence that is considered.
+    - corpus (BoilerplateCorpus): Optional cross-job boilerplate corpus.
+    - job (str): Stable name of this transcript in the corpus, such as its URL or path, so
+      that corrected or extended versions replace each other instead of counting as
+      separate jobs. Required with a corpus.
+    - model (str): Model whose encoding counts the tokens saved.
+
+    Returns:
+    - tuple: (deduplicated text, report dict with tokens before/after and segments removed per kind).
+    """
+    if corpus is not None and not job:
+        raise ValueError("A job name is needed to match against a boilerplate corpus")
+    seen_exact = set()
+    buckets = {}
+    signatures = []
+    removed = {'exact': 0, 'near': 0, 'boilerplate': 0}
+    lines = []
+
+    for prefix, sentences in split_segments(text):
+        kept = []
+        for sentence in sentences:
+            words = normalize(sentence)
+            if len(words) < min_words:
+                kept.append(sentence)
+                continue
+            key = ' '.join(words)
+            if key in seen_exact:
+                removed['exact'] += 1
+                continue
+            signature = minhash(shingles(words))
+            signatures.append(signature)
+            if corpus is not None and corpus.is_boilerplate(signature, job, threshold):
+                removed['boilerplate'] += 1
+                continue
+            keys = [(i, band) for i, band in enumerate(band_keys(signature))]
+            if any(similarity(signature, other) >= threshold for i, band in keys for other in buckets.get((i, band), ())):
+                removed['near'] += 1
+                continue
+            seen_exact.add(key)
+            for bucket in keys:
+                buckets.setdefault(bucket, []).append(signature)
+            kept.append(sentence)
+        if kept:
+            lines.append(prefix + ' '.join(kept))
+        elif not sentences:
+            lines.append(prefix)
+
+    if corpus is not None:
+        corpus.add(job, signatures)
+
+    result = '\n'.join(lines) + ('\n' if text.endswith('\n') else '')
+    counter = get_token_counter(model)
+    before, after = counter.count_text(text), counter.count_text(result)
+    report = dict(removed, tokens_before=before, tokens_after=after, tokens_saved=before - after,
+                  saved_percent=round(100 * (before - after) / before, 2) if before else 0.0)
+    return result, report
+
+def log_report(report):
+    log(f"Deduplication removed {report['exact']} exact, {report['near']} near-duplicate and "
+        f"{report['boilerplate']} boilerplate segments, saving {report['tokens_saved']} of "
+        f"{report['tokens_before']} tokens ({report['saved_percent']}%).")
+
+def main():
+    parser = argparse.ArgumentParser(description='Remove repeated and boilerplate segments from a transcript before summarization.')
+    parser.add_argument('input_file', help='Transcript in the "Speaker X: text" format.')
+    parser.add_argument('-o', '--output_file', help='Where to write the deduplicated transcript. Defaults to printing it.')
+    parser.add_argument('--threshold', type=float, default=0.8, help='Similarity at which two segments count as duplicates.')
+    parser.add_argument('--min_words', type=int, default=8, help='Shortest segment that is considered.')
+    parser.add_argument('--corpus', help='SQLite file of boilerplate seen across jobs.')
+    parser.add_argument('--min_jobs', type=int, default=2, help='Other jobs a segment must appear in to count as boilerplate.')
+    parser.add_argument('--job', help='Name of this transcript in the corpus. Defaults to the absolute input path.')
+    parser.add_argument('--engine', default="gpt-3.5-turbo-0613", help='Model whose tokenizer counts the savings.')
+    parser.add_argument('--json', dest='json_file', help='Also write the report to this JSON file.')
+    args = parser.parse_args()
+
+    with open(args.input_file, 'r') as file:
+        text = file.read()
+    corpus = BoilerplateCorpus(args.corpus, args.min_jobs) if args.corpus else None
+    try:
+        result, report = deduplicate(text, args.threshold, args.min_words, corpus, args.job or os.path.abspath(args.input_file), args.engine)
+    finally:
+        if corpus is not None:
+            corpus.close()
+
+    if args.output_file:
+        with open(args.output_file, 'w') as file:
+            file.write(result)
+    else:
+        print(result, end='')
+    log_report(report)
+    if args.json_file:
+        with open(args.json_file, 'w') as file:
+            json.dump(report, file, indent=2)
+
+if __name__ == '__main__':
+    main()
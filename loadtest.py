@@ -0,0 +1,195 @@
+#!/usr/bin/python3
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+import time
+import assemblyai as aai
+import openai
+import daemon
+import metrics
+import pipeline
+import summarize
+import transcribe
+from mockapi import MockAPIServer
+from synthetic import synthetic_transcript
+
+def synthetic_audio(directory, count, size=64 * 1024, seed=0):
+    """Write count placeholder audio chunks of the given size and return their paths."""
+    rng = random.Random(seed)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"split_{i}.mp3")
+        with open(path, 'wb') as file:
+            file.write(bytes(rng.getrandbits(8) for _ in range(size)))
+        paths.append(path)
+    return paths
+
+@contextlib.contextmanager
+def chunk_latencies():
+    """Record the latency of every summarize_chunk call made inside the block."""
+    latencies = []
+    summarize_chunk = summarize.summarize_chunk
+
+    def timed_summarize_chunk(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return summarize_chunk(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    summarize.summarize_chunk = timed_summarize_chunk
+    try:
+        yield latencies
+    finally:
+        summarize.summarize_chunk = summarize_chunk
+
+def count_summaries(output_file):
+    with open(output_file, 'r') as file:
+        return sum(1 for line in file if line.strip())
+
+def request_stats(server, latencies, concurrency, wall):
+    """Request rate, retry count and chunk latency percentiles of one run."""
+    requests = sum(server.stats[key] for key in ('chat_requests', 'uploads', 'transcripts_submitted', 'transcript_polls'))
+    return {
+        'concurrency': concurrency,
+        'wall_seconds': round(wall, 3),
+        'requests': requests,
+        'requests_per_second': round(requests / wall, 2) if wall else 0.0,
+        'chunks': len(latencies),
+        'retries': server.stats['chat_429'],
+        'p50_seconds': round(metrics.quantile(latencies, 0.5), 3),
+        'p95_seconds': round(metrics.quantile(latencies, 0.95), 3),
+        'p99_seconds': round(metrics.quantile(latencies, 0.99), 3),
+    }
+
+def run_configuration(server, audio_files, transcript_file, output_file, concurrency, prompt_max_tokens, poll_interval):
+    """
+    Run transcription and summarization once against the mock server.
+
+    Returns:
+    - dict: Wall-clock times, request rate, retry count and chunk latency percentiles.
+    """
+    server.stats.clear()
+    with chunk_latencies() as latencies, contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        transcribe.transcribe_files(audio_files, max_workers=concurrency, poll_interval=poll_interval)
+        transcribed = time.perf_counter()
+        summarize.generate_summaries(prompt_max_tokens=prompt_max_tokens, input_file=transcript_file,
+                                     output_file=output_file, concurrency=concurrency)
+        finished = time.perf_counter()
+
+    return dict(request_stats(server, latencies, concurrency, finished - started),
+                transcribe_seconds=round(transcribed - started, 3),
+                summarize_seconds=round(finished - transcribed, 3),
+                summaries=count_summaries(output_file))
+
+def run_pipeline_configuration(server, media_file, workdir, concurrency, poll_interval):
+    """
+    Run the whole pipeline once against the mock server, with a local media file in place of the download.
+
+    Conversion runs ffmpeg locally; transcription, chunking and summarization go through
+    pipeline.run_pipeline as in a real job, in a fresh workspace under workdir.
+
+    Returns:
+    - dict: As run_configuration, plus the conversion time.
+    """
+    server.stats.clear()
+    timings = {}
+
+    def timed(name, run):
+        def run_timed(options):
+            started = time.perf_counter()
+            try:
+                return run(options)
+            finally:
+                timings[name] = time.perf_counter() - started
+        return run_timed
+
+    media_file = os.path.abspath(media_file)
+    options = dict(daemon.default_options(), url=media_file, transcribe_concurrency=concurrency, summarize_concurrency=concurrency,
+                   poll_interval=poll_interval)
+    download = pipeline.Stage('download', [], lambda options: [media_file],
+                              lambda options: daemon.link_source(media_file, pipeline.source_file(options)))
+    stages = [download] + [pipeline.Stage(stage.name, stage.deps, stage.inputs, timed(stage.name, stage.run))
+                           for stage in pipeline.STAGES[1:]]
+
+    previous = os.getcwd()
+    os.chdir(tempfile.mkdtemp(dir=workdir))
+    try:
+        with chunk_latencies() as latencies, contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            pipeline.run_pipeline(options, force=True, stages=stages)
+            finished = time.perf_counter()
+        summaries = count_summaries(pipeline.SUMMARY_FILE)
+    finally:
+        os.chdir(previous)
+
+    return dict(request_stats(server, latencies, concurrency, finished - started),
+                conversion_seconds=round(timings.get('conversion', 0.0), 3),
+                transcribe_seconds=round(timings.get('transcribe', 0.0), 3),
+                summarize_seconds=round(timings.get('summarize', 0.0), 3),
+                summaries=summaries)
+
+def print_report(results):
+    columns = [column for column in ['concurrency', 'wall_seconds', 'conversion_seconds', 'transcribe_seconds', 'summarize_seconds',
+                                     'requests_per_second', 'chunks', 'retries', 'p50_seconds', 'p95_seconds', 'p99_seconds']
+               if results and column in results[0]]
+    print(' '.join(f"{column:>18}" for column in columns))
+    for result in results:
+        print(' '.join(f"{result[column]:>18}" for column in columns))
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the transcription and summarization pipeline against a local mock API.')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8], help='Concurrency levels to compare.')
+    parser.add_argument('--media', help='Local video or audio file; run the whole pipeline on it (ffmpeg conversion included) instead of only transcription and summarization.')
+    parser.add_argument('--words', type=int, default=20000, help='Words in the synthetic transcript.')
+    parser.add_argument('--audio_chunks', type=int, default=4, help='Number of synthetic audio chunks to transcribe.')
+    parser.add_argument('--prompt_max_tokens', type=int, default=2500, help='Max tokens per summarization chunk.')
+    parser.add_argument('--latency', type=float, default=0.2, help='Base latency of every mock request in seconds.')
+    parser.add_argument('--jitter', type=float, default=0.1, help='Maximum random latency added to every mock request.')
+    parser.add_argument('--error_rate', type=float, default=0.0, help='Fraction of chat requests answered with 429.')
+    parser.add_argument('--rpm', type=int, default=None, help='Mock chat requests allowed per minute.')
+    parser.add_argument('--tpm', type=int, default=None, help='Mock chat tokens allowed per minute.')
+    parser.add_argument('--transcribe_seconds', type=float, default=2.0, help='Time each mock transcript spends processing.')
+    parser.add_argument('--poll_interval', type=float, default=0.5, help='Seconds between transcription status polls.')
+    parser.add_argument('--json', dest='json_file', help='Also write the results to this JSON file.')
+    args = parser.parse_args()
+
+    server = MockAPIServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, rpm=args.rpm,
+                           tpm=args.tpm, transcribe_seconds=args.transcribe_seconds, seed=0).start()
+    openai.api_base = f"{server.url}/v1"
+    openai.api_key = openai.api_key or 'mock'
+    aai.settings.base_url = server.url
+    aai.settings.api_key = aai.settings.api_key or 'mock'
+
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            if args.media:
+                for concurrency in args.concurrency:
+                    print(f"Running the pipeline on {args.media} with concurrency {concurrency}...")
+                    results.append(run_pipeline_configuration(server, args.media, workdir, concurrency, args.poll_interval))
+            else:
+                audio_files = synthetic_audio(workdir, args.audio_chunks)
+                transcript_file = os.path.join(workdir, 'transcription.txt')
+                with open(transcript_file, 'w') as file:
+                    file.write(synthetic_transcript(args.words))
+
+                for concurrency in args.concurrency:
+                    print(f"Running with concurrency {concurrency}...")
+                    results.append(run_configuration(server, audio_files, transcript_file, os.path.join(workdir, 'summary.txt'),
+                                                     concurrency, args.prompt_max_tokens, args.poll_interval))
+    finally:
+        server.stop()
+
+    print_report(results)
+    if args.json_file:
+        with open(args.json_file, 'w') as file:
+            json.dump(results, file, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -7,7 +7,8 @@ import threading
 import random
 import argparse
 from dotenv import load_dotenv
-from tokencount import calculate_tokens
+import metrics
+import planner
 
 # Load .env file if it exists
 load_dotenv()
@@ -37,9 +38,33 @@ def log(message):
     #    with open(args.log_file, 'a') as f:
     #        f.write(message + '\n')
 
-def backoff_and_retry(api_call, max_retries=15):
+class BackoffGate:
+    """Shared pause that makes every worker back off together when the API is throttled."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resume_at = 0.0
+
+    def pause(self, seconds):
+        """Hold every caller of wait() for at least the given number of seconds."""
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    def wait(self):
+        """Block until the shared pause has elapsed."""
+        while True:
+            with self._lock:
+                delay = self._resume_at - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+def backoff_and_retry(api_call, max_retries=15, gate=None):
     last_exception = None
     for i in range(max_retries):
+        # Respect a backoff requested by any other worker sharing the gate
+        if gate is not None:
+            gate.wait()
         try:
             # Try to make the API call
             return api_call()
@@ -48,38 +73,39 @@ def backoff_and_retry(api_call, max_retries=15):
             last_exception = e
             wait_time = (2 ** i) + random.random()
             log(f"Rate limit reached. Waiting for {wait_time} seconds...")
-            time.sleep(wait_time)
+            metrics.add('retries')
+            metrics.add('backoff_seconds', wait_time)
+            if gate is not None:
+                gate.pause(wait_time)
+            else:
+                time.sleep(wait_time)
     # If we've retried the maximum number of times, re-raise the last error
     if last_exception:
         raise last_exception
 
-def research(file_name):
+def research(file_name, prompt="", models=None):
     """
     Researches the document and determines appropriate GPT model and token limits.
 
+    Uses planner.plan() to pick the model, chunk size and concurrency with the lowest
+    expected wall-clock time under the configured context windows and rate limits.
+
     Args:
     - file_name (str): Path to the file to be summarized.
+    - prompt (str): Summarization prompt the chunks are sent with.
+    - models (dict): Model table, defaults to planner.MODELS.
 
     Returns:
-    - dict: Model, max_token, and prompt_token values.
+    - dict: Model, max_token, prompt_token and concurrency values.
     """
-    # Determine token count of the file
-    token_count = calculate_tokens(file_name)
-
-    # Decision-making based on token count
-    if token_count > 7000:
-        model = 'gpt-3.5-turbo-16k'
-        max_token_limit = 16000
-    else:
-        model = 'gpt-4'
-        max_token_limit = 8000
-
-    # Calculate max_token and prompt_token
-    max_token = int(0.95 * max_token_limit)
-    prompt_token = int(0.5 * max_token)
+    with open(file_name, 'r') as file:
+        result = planner.plan_for_text(file.read(), prompt, models)
+    for reason in result['reasons']:
+        log(reason)
 
     return {
-        'model': model,
-        'max_token': max_token,
-        'prompt_token': prompt_token
+        'model': result['model'],
+        'max_token': result['max_tokens'],
+        'prompt_token': result['prompt_max_tokens'],
+        'concurrency': result['concurrency']
     }
@@ -0,0 +1,253 @@
+#!/usr/bin/python3
+import argparse
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+import uuid
+
+# Numeric span attributes that are summed into Prometheus counters
+COUNTERS = ('bytes', 'tokens_in', 'tokens_out', 'retries', 'backoff_seconds', 'cache_hits', 'cache_misses', 'chunks', 'tokens_saved')
+
+# Latency quantiles exported for every span name
+QUANTILES = (0.5, 0.9, 0.99)
+
+# Seconds between rewrites of the Prometheus textfile while spans keep finishing
+EXPORT_INTERVAL = 5.0
+
+class Span:
+    """
+    One timed operation, such as a pipeline stage, a transcription or a summarized chunk.
+
+    Attributes set with set() or add() are written with the span. Numeric attributes
+    named in COUNTERS are also summed per span name for the Prometheus export.
+    """
+
+    def __init__(self, name, parent=None, **attrs):
+        self.name = name
+        self.id = uuid.uuid4().hex[:16]
+        self.parent = parent
+        self.attrs = dict(attrs)
+        # Worker threads running under propagate() add to the span of the thread that started them
+        self._lock = threading.Lock()
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.seconds = None
+
+    def set(self, **attrs):
+        with self._lock:
+            self.attrs.update(attrs)
+
+    def add(self, key, amount=1):
+        with self._lock:
+            self.attrs[key] = self.attrs.get(key, 0) + amount
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self._started
+
+    def record(self):
+        return {'span': self.name, 'id': self.id, 'parent': self.parent, 'start': round(self.start, 6),
+                'seconds': round(self.seconds, 6), 'thread': threading.current_thread().name, **self.attrs}
+
+class _NullSpan:
+    """Stand-in returned while metrics are off, so instrumented code needs no checks."""
+
+    def set(self, **attrs):
+        pass
+
+    def add(self, key, amount=1):
+        pass
+
+_null_span = _NullSpan()
+
+class Recorder:
+    """Writes finished spans to a JSON-lines trace and keeps the aggregates for the Prometheus export."""
+
+    def __init__(self, trace_file=None, prometheus_file=None, labels=None):
+        self.trace_file = trace_file
+        self.prometheus_file = prometheus_file
+        self.labels = labels or {}
+        self.durations = collections.defaultdict(list)
+        self.counters = collections.defaultdict(float)
+        self._lock = threading.Lock()
+        self._trace = open(trace_file, 'a') if trace_file else None
+        self._last_export = 0.0
+
+    def finish(self, span):
+        line = json.dumps(dict(span.record(), **self.labels)) if self._trace else None
+        with self._lock:
+            self.durations[span.name].append(span.seconds)
+            for key in COUNTERS:
+                value = span.attrs.get(key)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    self.counters[(span.name, key)] += value
+            if line:
+                self._trace.write(line + '\n')
+                self._trace.flush()
+            export = self.prometheus_file and time.monotonic() - self._last_export >= EXPORT_INTERVAL
+        if export:
+            self.export()
+
+    def export(self):
+        """Rewrite the Prometheus textfile with the current aggregates."""
+        with self._lock:
+            self._last_export = time.monotonic()
+            text = format_prometheus(self.durations, self.counters, self.labels)
+        # Write to a temporary file first so the exporter never reads a partial file
+        with open(self.prometheus_file + '.tmp', 'w') as file:
+            file.write(text)
+        os.replace(self.prometheus_file + '.tmp', self.prometheus_file)
+
+    def close(self):
+        if self.prometheus_file:
+            self.export()
+        if self._trace:
+            self._trace.close()
+
+def quantile(values, q):
+    """Nearest-rank quantile of a list of numbers (0.0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+def format_prometheus(durations, counters, labels=None):
+    """Render span latencies as summaries and span counters as counters, in the Prometheus text format."""
+    def label_text(**extra):
+        pairs = dict(labels or {}, **extra)
+        return '{' + ','.join(f'{key}="{value}"' for key, value in sorted(pairs.items())) + '}'
+
+    lines = ['# HELP v2s_span_seconds Duration of pipeline spans.', '# TYPE v2s_span_seconds summary']
+    for name, values in sorted(durations.items()):
+        for q in QUANTILES:
+            lines.append(f"v2s_span_seconds{label_text(span=name, quantile=q)} {quantile(values, q):.6f}")
+        lines.append(f"v2s_span_seconds_sum{label_text(span=name)} {sum(values):.6f}")
+        lines.append(f"v2s_span_seconds_count{label_text(span=name)} {len(values)}")
+    for key in COUNTERS:
+        series = [(name, value) for (name, counter), value in sorted(counters.items()) if counter == key]
+        if not series:
+            continue
+        lines.append(f"# HELP v2s_{key}_total Sum of {key} over pipeline spans.")
+        lines.append(f"# TYPE v2s_{key}_total counter")
+        for name, value in series:
+            lines.append(f"v2s_{key}_total{label_text(span=name)} {value:g}")
+    return '\n'.join(lines) + '\n'
+
+# The active recorder, and the stack of open spans of each thread
+_recorder = None
+_local = threading.local()
+
+def configure(trace_file=None, prometheus_file=None, labels=None):
+    """
+    Turn on span recording.
+
+    Args:
+    - trace_file (str): JSON-lines file that every finished span is appended to.
+    - prometheus_file (str): Textfile (for node_exporter's textfile collector) rewritten with
+      latency quantiles and counters per span name.
+    - labels (dict): Constant labels added to every span and metric, e.g. the batch job.
+    """
+    global _recorder
+    close()
+    if trace_file or prometheus_file:
+        _recorder = Recorder(trace_file, prometheus_file, labels)
+
+def close():
+    """Flush and turn off span recording."""
+    global _recorder
+    if _recorder is not None:
+        _recorder.close()
+        _recorder = None
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    """
+    Time the enclosed block as a span nested under the thread's current span.
+
+    Yields:
+    - Span: Call set() or add() on it to attach attributes.
+    """
+    recorder = _recorder
+    if recorder is None:
+        yield _null_span
+        return
+    stack = _stack()
+    current = Span(name, stack[-1].id if stack else None, **attrs)
+    stack.append(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        stack.pop()
+        current.finish()
+        recorder.finish(current)
+
+def current_span():
+    """Return the innermost open span of this thread, or a no-op span."""
+    stack = _stack() if _recorder is not None else None
+    return stack[-1] if stack else _null_span
+
+def propagate(function):
+    """
+    Wrap a function handed to another thread so that it runs inside the current span.
+
+    The span stack is per thread, so spans opened in a ThreadPoolExecutor worker would
+    otherwise have no parent. Call this in the thread that submits the work.
+    """
+    parent = current_span()
+    if parent is _null_span:
+        return function
+
+    def run(*args, **kwargs):
+        stack = _stack()
+        stack.append(parent)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            stack.pop()
+    return run
+
+def add(key, amount=1):
+    """Add to a counter of the current span, e.g. retries from backoff_and_retry."""
+    current_span().add(key, amount)
+
+def summarize_trace(trace_file):
+    """Aggregate a JSON-lines trace into per-span counts, latency quantiles and counter totals."""
+    durations = collections.defaultdict(list)
+    counters = collections.defaultdict(float)
+    with open(trace_file, 'r') as file:
+        for line in file:
+            record = json.loads(line)
+            durations[record['span']].append(record['seconds'])
+            for key in COUNTERS:
+                if isinstance(record.get(key), (int, float)):
+                    counters[(record['span'], key)] += record[key]
+    return durations, counters
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize a trace written by the pipeline, or convert it to the Prometheus text format.')
+    parser.add_argument('trace_file', help='JSON-lines trace file.')
+    parser.add_argument('--prometheus', action='store_true', help='Print the Prometheus text format instead of a table.')
+    args = parser.parse_args()
+
+    durations, counters = summarize_trace(args.trace_file)
+    if args.prometheus:
+        print(format_prometheus(durations, counters), end='')
+        return
+    print(f"{'span':>20} {'count':>7} {'total_s':>10} {'p50_s':>9} {'p90_s':>9} {'p99_s':>9}  counters")
+    for name, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+        totals = ' '.join(f"{key}={value:g}" for (span_name, key), value in sorted(counters.items()) if span_name == name)
+        print(f"{name:>20} {len(values):>7} {sum(values):>10.3f} {quantile(values, 0.5):>9.3f} "
+              f"{quantile(values, 0.9):>9.3f} {quantile(values, 0.99):>9.3f}  {totals}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+#!/usr/bin/python3
+import argparse
+import collections
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from synthetic import WORDS
+
+class RateLimiter:
+    """Sliding one-minute window over requests and tokens, like the per-minute limits of the real APIs."""
+
+    def __init__(self, rpm=None, tpm=None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._events = collections.deque()
+        self._lock = threading.Lock()
+
+    def admit(self, tokens):
+        """Record a request of the given size, or return False if it would exceed a limit."""
+        now = time.monotonic()
+        with self._lock:
+            while self._events and now - self._events[0][0] > 60:
+                self._events.popleft()
+            if self.rpm is not None and len(self._events) + 1 > self.rpm:
+                return False
+            if self.tpm is not None and sum(used for _, used in self._events) + tokens > self.tpm:
+                return False
+            self._events.append((now, tokens))
+            return True
+
+class MockAPIServer:
+    """
+    Local stand-in for the OpenAI ChatCompletion and AssemblyAI transcription endpoints.
+
+    Every request waits latency seconds (plus up to jitter seconds) before answering.
+    Chat requests are rejected with 429 at error_rate, or when they would exceed the
+    rpm/tpm limits. Transcripts stay "processing" for transcribe_seconds after they are
+    submitted, then complete with synthetic diarized utterances.
+
+    Point the clients at it with OPENAI_API_BASE=<url>/v1 and ASSEMBLYAI_BASE_URL=<url>.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.2, jitter=0.1, error_rate=0.0,
+                 rpm=None, tpm=None, transcribe_seconds=2.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.transcribe_seconds = transcribe_seconds
+        self.limiter = RateLimiter(rpm, tpm)
+        self.random = random.Random(seed)
+        self.transcripts = {}
+        self.stats = collections.Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve requests on a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def delay(self):
+        with self._lock:
+            extra = self.random.random() * self.jitter
+        time.sleep(self.latency + extra)
+
+    def should_fail(self):
+        with self._lock:
+            return self.random.random() < self.error_rate
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, status, payload):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def read_body(self):
+                if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+                    body = b''
+                    while True:
+                        size = int(self.rfile.readline().strip(), 16)
+                        if size == 0:
+                            self.rfile.readline()
+                            return body
+                        body += self.rfile.read(size)
+                        self.rfile.readline()
+                return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+            def do_POST(self):
+                body = self.read_body()
+                if self.path.endswith('/chat/completions'):
+                    server.chat_completion(self, json.loads(body))
+                elif self.path == '/v2/upload':
+                    server.count('uploads')
+                    server.count('upload_bytes', len(body))
+                    server.delay()
+                    self.send_json(200, {'upload_url': f"{server.url}/audio/{uuid.uuid4().hex}?bytes={len(body)}"})
+                elif self.path == '/v2/transcript':
+                    server.submit_transcript(self, json.loads(body))
+                else:
+                    self.send_json(404, {'error': f'unknown path {self.path}'})
+
+            def do_GET(self):
+                if self.path.startswith('/v2/transcript/'):
+                    server.get_transcript(self, self.path.rsplit('/', 1)[1])
+                else:
+                    self.send_json(404, {'error': f'unknown path {self.path}'})
+
+        return Handler
+
+    def chat_completion(self, handler, request):
+        self.count('chat_requests')
+        # Roughly four characters per token is close enough for rate limiting
+        prompt_tokens = sum(len(message.get('content', '')) for message in request.get('messages', [])) // 4
+        completion_tokens = min(request.get('max_tokens') or 256, 256)
+
+        self.delay()
+        if self.should_fail() or not self.limiter.admit(prompt_tokens + completion_tokens):
+            self.count('chat_429')
+            handler.send_json(429, {'error': {'message': 'Rate limit reached for requests', 'type': 'requests', 'code': 'rate_limit_exceeded'}})
+            return
+
+        self.count('chat_ok')
+        self.count('prompt_tokens', prompt_tokens)
+        content = f"- Summary of {prompt_tokens} prompt tokens."
+        if request.get('stream'):
+            self.stream_completion(handler, request, content)
+            return
+        handler.send_json(200, {
+            'id': f"chatcmpl-{uuid.uuid4().hex}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens, 'total_tokens': prompt_tokens + completion_tokens},
+        })
+
+    def stream_completion(self, handler, request, content, pieces=8):
+        """Answer with server-sent events, one delta per word, spread over the latency."""
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        words = content.split(' ')
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'text/event-stream')
+        handler.send_header('Transfer-Encoding', 'chunked')
+        handler.end_headers()
+
+        def send_event(payload):
+            data = f"data: {payload}\n\n".encode('utf-8')
+            handler.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+            handler.wfile.flush()
+
+        for i, word in enumerate(words):
+            delta = {'content': word if i == 0 else ' ' + word}
+            if i == 0:
+                delta['role'] = 'assistant'
+            send_event(json.dumps({'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                                   'model': request.get('model'), 'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]}))
+            time.sleep(self.latency / pieces)
+        send_event(json.dumps({'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                               'model': request.get('model'), 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]}))
+        send_event('[DONE]')
+        handler.wfile.write(b"0\r\n\r\n")
+        handler.wfile.flush()
+
+    def submit_transcript(self, handler, request):
+        self.count('transcripts_submitted')
+        self.delay()
+        transcript_id = uuid.uuid4().hex
+        with self._lock:
+            self.transcripts[transcript_id] = {'audio_url': request.get('audio_url'), 'ready_at': time.monotonic() + self.transcribe_seconds}
+        handler.send_json(200, {'id': transcript_id, 'status': 'queued', 'audio_url': request.get('audio_url')})
+
+    def get_transcript(self, handler, transcript_id):
+        self.count('transcript_polls')
+        with self._lock:
+            transcript = self.transcripts.get(transcript_id)
+        if transcript is None:
+            handler.send_json(404, {'error': 'transcript not found'})
+            return
+        if time.monotonic() < transcript['ready_at']:
+            handler.send_json(200, {'id': transcript_id, 'status': 'processing', 'audio_url': transcript['audio_url']})
+            return
+
+        utterances = synthetic_utterances(seed=transcript_id)
+        handler.send_json(200, {
+            'id': transcript_id,
+            'status': 'completed',
+            'audio_url': transcript['audio_url'],
+            'text': ' '.join(utterance['text'] for utterance in utterances),
+            'utterances': utterances,
+            'words': [word for utterance in utterances for word in utterance['words']],
+        })
+
+def synthetic_utterances(count=20, speakers=2, seed=None):
+    """Generate diarized utterances with word-level timestamps (in ms)."""
+    rng = random.Random(seed)
+    utterances = []
+    clock = 0
+    for i in range(count):
+        speaker = chr(ord('A') + i % speakers)
+        words = []
+        for _ in range(rng.randint(5, 25)):
+            duration = rng.randint(150, 450)
+            words.append({'text': rng.choice(WORDS), 'start': clock, 'end': clock + duration, 'confidence': 0.9, 'speaker': speaker})
+            clock += duration + rng.randint(0, 100)
+        utterances.append({
+            'speaker': speaker,
+            'text': ' '.join(word['text'] for word in words),
+            'start': words[0]['start'],
+            'end': words[-1]['end'],
+            'confidence': 0.9,
+            'words': words,
+        })
+        clock += 500
+    return utterances
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local stand-in for the OpenAI and AssemblyAI APIs.')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on.')
+    parser.add_argument('--latency', type=float, default=0.2, help='Base latency of every request in seconds.')
+    parser.add_argument('--jitter', type=float, default=0.1, help='Maximum random latency added to every request in seconds.')
+    parser.add_argument('--error_rate', type=float, default=0.0, help='Fraction of chat requests answered with 429.')
+    parser.add_argument('--rpm', type=int, default=None, help='Chat requests allowed per minute.')
+    parser.add_argument('--tpm', type=int, default=None, help='Chat tokens allowed per minute.')
+    parser.add_argument('--transcribe_seconds', type=float, default=2.0, help='Time each transcript spends processing.')
+    args = parser.parse_args()
+
+    server = MockAPIServer(port=args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                           rpm=args.rpm, tpm=args.tpm, transcribe_seconds=args.transcribe_seconds)
+    print(f"Mock API listening on {server.url}")
+    print(f"export OPENAI_API_BASE={server.url}/v1 ASSEMBLYAI_BASE_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,356 @@
+#!/usr/bin/python3
+import argparse
+import hashlib
+import json
+import os
+import sys
+import traceback
+import chnk
+import dedup
+import stitch
+import streaming
+import summarize
+import transcribe
+import transcriptstore
+import v2a
+import metrics
+import planner
+import ytget
+from mergecore import log
+
+# File names used by the stages, relative to the working directory
+VIDEO_FILE = 'video.mp4'
+# The audio stream as YouTube serves it (MP4/AAC or WebM/Opus); ffmpeg detects the container from the content
+AUDIO_SOURCE_FILE = 'audio'
+AUDIO_FILE = 'output.mp3'
+PROCESSED_FILE = 'processed.flac'
+PROCESSED_AUDIO_FILE = 'output.opus'
+TRANSCRIPT_FILE = 'transcription.txt'
+DEDUP_FILE = 'transcription.dedup.txt'
+TRANSCRIPT_STORE = 'transcription.v2st'
+SUMMARY_FILE = 'summary.txt'
+SUMMARY_MANIFEST = 'summary.manifest.json'
+STATE_FILE = '.process_state.json'
+
+class Cancelled(Exception):
+    """Raised between stages when a run is cancelled."""
+
+class Stage:
+    """One step of the pipeline: what it depends on, what it reads and how it runs."""
+
+    def __init__(self, name, deps, inputs, run):
+        self.name = name
+        self.deps = deps
+        self.inputs = inputs
+        self.run = run
+
+def hash_inputs(values):
+    """Hash stage options and the contents of any input files."""
+    digest = hashlib.sha256()
+    for value in values:
+        digest.update(repr(value).encode('utf-8'))
+        if isinstance(value, str) and os.path.isfile(value):
+            with open(value, 'rb') as file:
+                for block in iter(lambda: file.read(1024 * 1024), b''):
+                    digest.update(block)
+    return digest.hexdigest()
+
+def manifest_files():
+    """Return the audio chunk files listed in the manifest written by v2a.py."""
+    if not os.path.isfile(v2a.manifest_file):
+        return []
+    return [chunk['file'] for chunk in stitch.load_manifest(v2a.manifest_file)]
+
+def source_file(options):
+    """Return the downloaded file the conversion reads: the video, or the audio-only stream."""
+    return AUDIO_SOURCE_FILE if options.get('audio_only') else VIDEO_FILE
+
+def request_budget(options):
+    """
+    Token budget shared by the messages and the completion of each summarization request.
+
+    Defaults to the engine's context window from planner.MODELS (the smallest known
+    window for an unknown engine), so no request asks for more than the model can take.
+    """
+    if options.get('max_tokens'):
+        return options['max_tokens']
+    limits = planner.MODELS.get(options['engine'])
+    return limits['context'] if limits else min(model['context'] for model in planner.MODELS.values())
+
+def chunk_overlap(options):
+    """Seconds of overlap between audio chunks: the overlap option, or v2a's default for the split mode."""
+    if options.get('overlap') is not None:
+        return options['overlap']
+    return v2a.default_overlap(options.get('silence', False))
+
+def summary_source(options):
+    """Return the transcript the chunk and summarize stages read: the deduplicated one with --dedup."""
+    return DEDUP_FILE if options.get('dedup') else TRANSCRIPT_FILE
+
+def run_download(options):
+    if options.get('audio_only'):
+        # Parallel, resumable ranged download of the audio stream as is; the conversion stage encodes it once
+        ytget.download_audio(options['url'], AUDIO_SOURCE_FILE, '.')
+    else:
+        ytget.download_video(options['url'], VIDEO_FILE, '.')
+    return [source_file(options)]
+
+def run_conversion(options):
+    max_bytes = options['size'] * 1024 * 1024
+    if options.get('profile') == 'transcription':
+        # Chunk times refer to the processed audio; the time map converts them back to the source
+        report = v2a.preprocess_for_transcription(source_file(options), PROCESSED_FILE, options.get('trim_silence', False),
+                                                  options.get('tempo', 1.0))
+        files = v2a.convert_parallel(PROCESSED_FILE, PROCESSED_AUDIO_FILE, max_bytes, jobs=options['jobs'], overlap=chunk_overlap(options),
+                                     silence=options['silence'], profile='transcription')
+        v2a.report_savings(report, files, max_bytes)
+        return files + [v2a.manifest_file, v2a.time_map_file]
+    return v2a.convert_parallel(source_file(options), AUDIO_FILE, max_bytes, jobs=options['jobs'],
+                                overlap=chunk_overlap(options), silence=options['silence']) + [v2a.manifest_file]
+
+def run_transcription(options):
+    chunks = stitch.load_manifest(v2a.manifest_file)
+    transcripts = transcribe.transcribe_files([chunk['file'] for chunk in chunks], max_workers=options['transcribe_concurrency'],
+                                             poll_interval=options.get('poll_interval'))
+    utterances = stitch.stitch(transcripts, chunks)
+    if options.get('profile') == 'transcription':
+        utterances = v2a.remap_utterances(utterances, v2a.load_time_map())
+    with open(TRANSCRIPT_FILE, 'w') as file:
+        for utterance in utterances:
+            file.write(f"Speaker {utterance['speaker']}: {utterance['text']}\n")
+    # Keep the times and word-level data too, indexed for range and speaker lookups
+    transcriptstore.write_store(utterances, TRANSCRIPT_STORE)
+    return [TRANSCRIPT_FILE, TRANSCRIPT_STORE]
+
+def run_dedup(options):
+    if not options.get('dedup'):
+        return []
+    with open(TRANSCRIPT_FILE, 'r') as file:
+        text = file.read()
+    corpus = dedup.BoilerplateCorpus(options['dedup_corpus']) if options.get('dedup_corpus') else None
+    try:
+        text, report = dedup.deduplicate(text, corpus=corpus, job=options.get('url'), model=options['engine'])
+    finally:
+        if corpus is not None:
+            corpus.close()
+    dedup.log_report(report)
+    metrics.add('tokens_saved', report['tokens_saved'])
+    with open(DEDUP_FILE, 'w') as file:
+        file.write(text)
+    return [DEDUP_FILE]
+
+def run_chunking(options):
+    def texts():
+        for chunk, tokens in chnk.iter_chunks(summary_source(options), options['chunk_tokens'], options['engine']):
+            metrics.add('tokens_in', tokens)
+            yield chunk
+
+    count = chnk.write_chunks_to_files(texts(), '.')
+    metrics.add('chunks', count)
+    return [f"chunk_{i + 1}.txt" for i in range(count)]
+
+def run_summarization(options):
+    summarize.generate_summaries(input_file=summary_source(options), output_file=SUMMARY_FILE, engine=options['engine'],
+                                 max_tokens=request_budget(options), concurrency=options['summarize_concurrency'], reduce=options.get('reduce', False),
+                                 manifest_file=SUMMARY_MANIFEST if options.get('incremental') else None)
+    return [SUMMARY_FILE]
+
+STAGES = [
+    Stage('download', [], lambda options: [options['url'], options.get('audio_only')], run_download),
+    Stage('conversion', ['download'], lambda options: [source_file(options), options['size'], chunk_overlap(options), options['silence'],
+                                                       options.get('profile'), options.get('trim_silence'), options.get('tempo')], run_conversion),
+    Stage('transcribe', ['conversion'], lambda options: [v2a.manifest_file] + manifest_files(), run_transcription),
+    Stage('dedup', ['transcribe'], lambda options: [TRANSCRIPT_FILE, options.get('dedup'), options.get('dedup_corpus'), options['engine']], run_dedup),
+    Stage('chunk', ['dedup'], lambda options: [summary_source(options), options['chunk_tokens'], options['engine']], run_chunking),
+    Stage('summarize', ['dedup'], lambda options: [summary_source(options), options['engine'], request_budget(options), options.get('reduce', False),
+                                                   options.get('incremental', False)], run_summarization),
+]
+
+def topological_order(stages):
+    """Order stages so that each one runs after its dependencies."""
+    by_name = {stage.name: stage for stage in stages}
+    ordered = []
+    visiting = set()
+
+    def visit(stage):
+        if stage in ordered:
+            return
+        if stage.name in visiting:
+            raise ValueError(f"Pipeline stages form a cycle at {stage.name}")
+        visiting.add(stage.name)
+        for dep in stage.deps:
+            visit(by_name[dep])
+        visiting.discard(stage.name)
+        ordered.append(stage)
+
+    for stage in stages:
+        visit(stage)
+    return ordered
+
+def load_state(path=STATE_FILE):
+    if not os.path.isfile(path):
+        return {}
+    with open(path, 'r') as file:
+        return json.load(file)
+
+def save_state(state, path=STATE_FILE):
+    with open(path, 'w') as file:
+        json.dump(state, file, indent=2)
+
+def run_pipeline(options, stop_after=None, force=False, stages=STAGES, cancel=None):
+    """
+    Run the pipeline stages in one process, skipping those whose inputs are unchanged.
+
+    A stage is skipped when the hash of its inputs matches the last successful run and
+    all of its outputs still exist, so an interrupted run resumes where it stopped.
+
+    Args:
+    - options (dict): Stage options (url, size, jobs, overlap, silence, transcribe_concurrency,
+      summarize_concurrency, chunk_tokens, engine).
+    - stop_after (str): Name of the last stage to run, or None to run them all.
+    - force (bool): Run every stage even if its inputs are unchanged.
+    - cancel (threading.Event): When set, the run stops with Cancelled before the next stage.
+
+    Returns:
+    - dict: Outputs of each stage that ran or was skipped.
+    """
+    state = load_state()
+    outputs = {}
+    ordered = topological_order(stages)
+    if stop_after is not None:
+        # Keep only the stop stage and the stages it depends on
+        by_name = {stage.name: stage for stage in stages}
+        needed = set()
+        pending = [stop_after]
+        while pending:
+            name = pending.pop()
+            if name not in needed:
+                needed.add(name)
+                pending.extend(by_name[name].deps)
+        ordered = [stage for stage in ordered if stage.name in needed]
+
+    for stage in ordered:
+        if cancel is not None and cancel.is_set():
+            raise Cancelled(f"Cancelled before {stage.name}")
+        digest = hash_inputs(stage.inputs(options))
+        previous = state.get(stage.name)
+        if not force and previous and previous['inputs'] == digest and all(os.path.exists(path) for path in previous['outputs']):
+            log(f"Skipping {stage.name}: inputs unchanged.")
+            outputs[stage.name] = previous['outputs']
+            continue
+
+        log(f"Running {stage.name}...")
+        with metrics.span(f"stage:{stage.name}"):
+            outputs[stage.name] = stage.run(options)
+        state[stage.name] = {'inputs': digest, 'outputs': outputs[stage.name]}
+        save_state(state)
+
+    return outputs
+
+def run_job(options, stop_after=None, force=False, stream=False, cancel=None, stages=STAGES):
+    """
+    Run the whole pipeline for one URL in the current working directory.
+
+    stages replaces the stage list, e.g. with a download stage that links a local file.
+
+    With stream=True, conversion, transcription, chunking and summarization run
+    overlapped through streaming.stream_pipeline once the download stage is done.
+
+    When options name a trace_file or prometheus_file, spans are recorded for the
+    duration of the job.
+    """
+    traced = options.get('trace_file') or options.get('prometheus_file')
+    if traced:
+        metrics.configure(options.get('trace_file'), options.get('prometheus_file'), options.get('metrics_labels'))
+    try:
+        with metrics.span('job', url=options['url']):
+            if stream:
+                run_pipeline(options, stop_after='download', force=force, stages=stages, cancel=cancel)
+                if stop_after is None:
+                    if cancel is not None and cancel.is_set():
+                        raise Cancelled("Cancelled before streaming")
+                    with metrics.span('stage:stream'):
+                        streaming.stream_pipeline(source_file(options), SUMMARY_FILE, TRANSCRIPT_FILE, options['size'] * 1024 * 1024,
+                                                  overlap=chunk_overlap(options), silence=options['silence'],
+                                                  transcribe_workers=options['transcribe_concurrency'],
+                                                  summarize_workers=options['summarize_concurrency'],
+                                                  engine=options['engine'], max_tokens=request_budget(options))
+            else:
+                run_pipeline(options, stop_after=stop_after, force=force, stages=stages, cancel=cancel)
+    finally:
+        if traced:
+            metrics.close()
+
+def add_stage_arguments(parser):
+    """Add the options shared by every pipeline entry point to an argument parser."""
+    parser.add_argument('--stream', action='store_true', help='Overlap conversion, transcription, chunking and summarization instead of running them one after another.')
+    parser.add_argument('--force', action='store_true', help='Run every stage even if its inputs are unchanged.')
+    parser.add_argument('--audio-only', action='store_true', help='Download only the best audio stream instead of the video.')
+    parser.add_argument('-s', '--size', type=int, default=25, help='The maximum audio chunk size in MB.')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='Parallel ffmpeg processes used for conversion.')
+    parser.add_argument('--overlap', type=float, default=None, help=f'Seconds of overlap between audio chunks. Defaults to {v2a.overlap}, or {v2a.silence_overlap} with --silence.')
+    parser.add_argument('--silence', action='store_true', help='Split audio chunks at detected silences.')
+    parser.add_argument('--profile', choices=sorted(v2a.PROFILES), default='mp3', help='Audio profile; "transcription" uploads mono 16 kHz Opus (not used with --stream).')
+    parser.add_argument('--trim_silence', action='store_true', help='With --profile transcription, remove leading, trailing and long internal silences.')
+    parser.add_argument('--tempo', type=v2a.tempo_factor, default=1.0, help='With --profile transcription, speed the audio up by this factor.')
+    parser.add_argument('--concurrency', type=int, default=4, help='Concurrent transcription and summarization requests.')
+    parser.add_argument('--transcribe_concurrency', type=int, default=None, help='Concurrent transcription requests (defaults to --concurrency).')
+    parser.add_argument('--summarize_concurrency', type=int, default=None, help='Concurrent summarization requests (defaults to --concurrency).')
+    parser.add_argument('--chunk_tokens', type=int, default=4096, help='The maximum number of tokens per text chunk.')
+    parser.add_argument('--engine', default="gpt-3.5-turbo-0613", help='Specify the engine to be used.')
+    parser.add_argument('--max_tokens', type=int, default=None, help="Token budget for each summarization request's messages and completion. Defaults to the engine's context window.")
+    parser.add_argument('--trace', help='Append a JSON-lines span for every stage, request and chunk to this file.')
+    parser.add_argument('--prometheus', help='Write latency quantiles and counters to this Prometheus textfile.')
+    parser.add_argument('--reduce', action='store_true', help='Merge the chunk summaries into a single summary (not used with --stream).')
+    parser.add_argument('--dedup', action='store_true', help='Drop repeated and near-duplicate segments before chunking (not used with --stream).')
+    parser.add_argument('--dedup_corpus', help='With --dedup, a SQLite file of boilerplate shared across jobs.')
+    parser.add_argument('--incremental', action='store_true', help='Reuse the summaries of unchanged chunks from summary.manifest.json when the transcript changes (a first run makes about a third more chunks).')
+
+def options_from_args(args, url):
+    """Build the stage options for one URL from parsed arguments."""
+    return {
+        'url': url,
+        'audio_only': args.audio_only,
+        'size': args.size,
+        'jobs': args.jobs,
+        'overlap': args.overlap,
+        'silence': args.silence,
+        'profile': args.profile,
+        'trim_silence': args.trim_silence,
+        'tempo': args.tempo,
+        'transcribe_concurrency': args.transcribe_concurrency or args.concurrency,
+        'summarize_concurrency': args.summarize_concurrency or args.concurrency,
+        'chunk_tokens': args.chunk_tokens,
+        'engine': args.engine,
+        'max_tokens': args.max_tokens,
+        'reduce': args.reduce,
+        'dedup': args.dedup,
+        'incremental': args.incremental,
+        'dedup_corpus': os.path.abspath(args.dedup_corpus) if args.dedup_corpus else None,
+        # The working directory changes per batch job, so keep these absolute
+        'trace_file': os.path.abspath(args.trace) if args.trace else None,
+        'prometheus_file': os.path.abspath(args.prometheus) if args.prometheus else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Download a YouTube video, convert it to audio, transcribe it, chunk the transcription, and generate a summary.')
+    parser.add_argument('url', help='The URL of the YouTube video.')
+    parser.add_argument('--stop-download', dest='stop_after', action='store_const', const='download', help='Stop after downloading the video.')
+    parser.add_argument('--stop-conversion', dest='stop_after', action='store_const', const='conversion', help='Stop after converting the video to audio.')
+    parser.add_argument('--stop-transcribe', dest='stop_after', action='store_const', const='transcribe', help='Stop after transcribing the audio.')
+    parser.add_argument('--stop-chunk', dest='stop_after', action='store_const', const='chunk', help='Stop after chunking the transcription.')
+    add_stage_arguments(parser)
+    args = parser.parse_args()
+
+    if args.stream and args.stop_after and args.stop_after != 'download':
+        parser.error("--stream runs conversion through summarization together; only --stop-download applies")
+
+    try:
+        run_job(options_from_args(args, args.url), stop_after=args.stop_after, force=args.force, stream=args.stream)
+    except (Exception, SystemExit) as e:
+        log(f"Error during pipeline: {e}")
+        traceback.print_exc()
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/python3
+import argparse
+import json
+import math
+from tokencount import get_token_counter
+
+# Configured limits per model. Override them with measured figures through load_limits().
+# - context: context window in tokens
+# - tpm / rpm: tokens and requests allowed per minute
+# - latency: seconds of fixed overhead per request
+# - input_tps / output_tps: prompt and completion tokens processed per second
+MODELS = {
+    'gpt-3.5-turbo-0613': {'context': 4096, 'tpm': 90000, 'rpm': 3500, 'latency': 0.8, 'input_tps': 4000, 'output_tps': 60},
+    'gpt-3.5-turbo-16k-0613': {'context': 16384, 'tpm': 180000, 'rpm': 3500, 'latency': 1.0, 'input_tps': 4000, 'output_tps': 60},
+    'gpt-4-0613': {'context': 8192, 'tpm': 10000, 'rpm': 200, 'latency': 1.5, 'input_tps': 1500, 'output_tps': 20},
+    'gpt-4-32k-0613': {'context': 32768, 'tpm': 30000, 'rpm': 200, 'latency': 2.0, 'input_tps': 1500, 'output_tps': 20},
+}
+
+# Transcript tokens per chunk that the planner tries
+CHUNK_SIZES = (1000, 1500, 2000, 3000, 4000, 6000, 8000, 12000, 16000, 24000, 30000)
+
+# Tokens added by the system message, chunk header and message formatting
+MESSAGE_OVERHEAD = 40
+
+def load_limits(path, models=None):
+    """
+    Merge per-model figures from a JSON file into a copy of the model table.
+
+    The file maps model names to any of the MODELS fields, e.g. the TPM/RPM limits
+    from the API's rate-limit headers or the p50 latency measured by loadtest.py.
+    Unknown models are added and must then give every field.
+    """
+    models = {name: dict(limits) for name, limits in (models or MODELS).items()}
+    with open(path, 'r') as file:
+        for name, limits in json.load(file).items():
+            models.setdefault(name, {}).update(limits)
+    return models
+
+def estimate_seconds(requests, concurrency, request_seconds, request_tokens, tpm, rpm):
+    """
+    Expected wall-clock seconds for a batch of equal requests.
+
+    The batch takes at least ceil(requests / concurrency) round trips. Work above one
+    minute's worth of the TPM or RPM limit has to wait for the window to refill.
+    """
+    round_trips = math.ceil(requests / concurrency) * request_seconds
+    tpm_wait = max(0, requests * request_tokens - tpm) / tpm * 60
+    rpm_wait = max(0, requests - rpm) / rpm * 60
+    return max(round_trips, tpm_wait, rpm_wait)
+
+def plan(token_count, prompt_tokens, models=None, summary_tokens=400, max_concurrency=16, min_chunk_tokens=1000):
+    """
+    Choose the model, chunk size and concurrency with the lowest expected wall-clock time.
+
+    Every model and chunk size that fits the context window is scored with
+    estimate_seconds(). For each, the concurrency is the smallest one that gets within
+    5% of the best time, since more parallel requests past the rate limit only turn
+    into 429s.
+
+    Args:
+    - token_count (int): Tokens in the transcript.
+    - prompt_tokens (int): Tokens in the summarization prompt.
+    - models (dict): Model table, defaults to MODELS.
+    - summary_tokens (int): Completion tokens reserved for each chunk summary.
+    - max_concurrency (int): Upper bound on concurrent requests.
+    - min_chunk_tokens (int): Smallest chunk worth sending, to keep the summaries meaningful.
+
+    Returns:
+    - dict: model, prompt_max_tokens and max_tokens (as summarize.generate_summaries takes
+      them), concurrency, chunks, expected_seconds and the reasons behind the choice.
+    """
+    models = models or MODELS
+    reasons = [f"Transcript has {token_count} tokens, prompt has {prompt_tokens} tokens, {summary_tokens} tokens reserved per summary."]
+    best = None
+    for model, limits in models.items():
+        fits = [size for size in CHUNK_SIZES
+                if size + prompt_tokens + MESSAGE_OVERHEAD + summary_tokens <= limits['context']]
+        # Never cut the transcript smaller than it has to be
+        fits = [size for size in fits if size >= min_chunk_tokens or size >= token_count] or fits[:1]
+        if not fits:
+            reasons.append(f"{model}: skipped, a {CHUNK_SIZES[0]}-token chunk does not fit its {limits['context']}-token context.")
+            continue
+
+        model_best = None
+        for size in fits:
+            chunks = max(1, math.ceil(token_count / size))
+            size = math.ceil(token_count / chunks) if token_count else size
+            request_tokens = size + prompt_tokens + MESSAGE_OVERHEAD + summary_tokens
+            request_seconds = (limits['latency'] + (size + prompt_tokens + MESSAGE_OVERHEAD) / limits['input_tps']
+                               + summary_tokens / limits['output_tps'])
+            times = [estimate_seconds(chunks, concurrency, request_seconds, request_tokens, limits['tpm'], limits['rpm'])
+                     for concurrency in range(1, min(max_concurrency, chunks) + 1)]
+            concurrency = next(i + 1 for i, seconds in enumerate(times) if seconds <= min(times) * 1.05)
+            candidate = {
+                'model': model,
+                'prompt_max_tokens': size + prompt_tokens,
+                'max_tokens': request_tokens,
+                'concurrency': concurrency,
+                'chunks': chunks,
+                'expected_seconds': round(times[concurrency - 1], 2),
+            }
+            if model_best is None or candidate['expected_seconds'] < model_best['expected_seconds']:
+                model_best = candidate
+
+        reasons.append(f"{model}: best with {model_best['chunks']} chunks of ~{model_best['prompt_max_tokens'] - prompt_tokens} tokens "
+                       f"at concurrency {model_best['concurrency']}, about {model_best['expected_seconds']}s "
+                       f"(TPM {limits['tpm']}, RPM {limits['rpm']}, {limits['latency']}s latency).")
+        if best is None or model_best['expected_seconds'] < best['expected_seconds']:
+            best = model_best
+
+    if best is None:
+        raise ValueError("No model has a context window large enough for the prompt and a summary.")
+    reasons.append(f"Chose {best['model']}: lowest expected wall-clock time ({best['expected_seconds']}s).")
+    best['reasons'] = reasons
+    return best
+
+def plan_for_text(text, prompt, models=None, **kwargs):
+    """Plan for a transcript and prompt given as text, counting tokens with the first model's encoding."""
+    models = models or MODELS
+    counter = get_token_counter(next(iter(models)))
+    return plan(counter.count_text(text), counter.count(prompt), models, **kwargs)
+
+def print_plan(result):
+    for reason in result['reasons']:
+        print(reason)
+    print(f"Plan: --engine {result['model']} --prompt_max_tokens {result['prompt_max_tokens']} "
+          f"--max_tokens {result['max_tokens']} --concurrency {result['concurrency']}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Plan the model, chunk size and concurrency for summarizing a transcript.')
+    parser.add_argument('input_file', help='The transcript to summarize.')
+    parser.add_argument('--prompt', default=None, help='The summarization prompt. Defaults to the one summarize.py uses.')
+    parser.add_argument('--limits', help='JSON file with measured or configured per-model limits.')
+    parser.add_argument('--models', nargs='+', help='Only consider these models.')
+    parser.add_argument('--summary_tokens', type=int, default=400, help='Completion tokens reserved per summary.')
+    parser.add_argument('--max_concurrency', type=int, default=16, help='Upper bound on concurrent requests.')
+    parser.add_argument('--json', action='store_true', help='Print the plan as JSON.')
+    args = parser.parse_args()
+
+    if args.prompt is None:
+        from summarize import DEFAULT_PROMPT
+        args.prompt = DEFAULT_PROMPT
+    models = load_limits(args.limits) if args.limits else MODELS
+    if args.models:
+        models = {name: models[name] for name in args.models}
+    with open(args.input_file, 'r') as file:
+        result = plan_for_text(file.read(), args.prompt, models, summary_tokens=args.summary_tokens,
+                               max_concurrency=args.max_concurrency)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_plan(result)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import metrics
+
+class ResponseCache:
+    """
+    Persistent, content-addressed cache for ChatCompletion responses.
+
+    Responses are stored in a SQLite file keyed by a hash of the request
+    (engine, messages, temperature and max_tokens). Entries are evicted in
+    least-recently-used order once max_entries is exceeded, and entries older
+    than max_age seconds are dropped.
+    """
+
+    def __init__(self, path, max_entries=None, max_age=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # The connection is shared by the summarization worker threads, guarded by _lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+            "created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._conn.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(engine, messages, temperature, max_tokens):
+        """Hash the request parameters that determine the response."""
+        payload = json.dumps({
+            "engine": engine,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached response for key, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.max_age is not None and now - row[1] > self.max_age):
+                self.misses += 1
+                metrics.add('cache_misses')
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        metrics.add('cache_hits')
+        return json.loads(row[0])
+
+    def put(self, key, response):
+        """Store a response and evict entries beyond the configured limits."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(response), now, now)
+            )
+            self._conn.commit()
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones above max_entries."""
+        with self._lock:
+            if self.max_age is not None:
+                self._conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.max_age,))
+            if self.max_entries is not None:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+            self._conn.commit()
+
+    def get_or_call(self, key, api_call):
+        """Return the cached response for key, calling api_call and caching its result on a miss."""
+        response = self.get(key)
+        if response is None:
+            response = api_call()
+            self.put(key, response)
+        return response
+
+    def stats(self):
+        """Return hit/miss counters and the current number of entries."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,247 @@
+#!/usr/bin/python3
+import argparse
+import difflib
+import json
+import re
+from collections import Counter
+
+def _field(item, name, default=None):
+    """Read a field from an SDK object or from a plain dict."""
+    if isinstance(item, dict):
+        return item.get(name, default)
+    return getattr(item, name, default)
+
+def _normalize(text):
+    """Lowercase a word and strip punctuation so the same speech matches across chunks."""
+    return re.sub(r"[^\w']", "", text.lower())
+
+def utterance_words(utterance):
+    """
+    Return the words of an utterance as dicts with text, speaker, start and end (in ms).
+
+    When the transcript carries no word-level data, the utterance text is split on
+    whitespace and the words are spread evenly over the utterance's time range.
+    """
+    speaker = _field(utterance, 'speaker')
+    words = _field(utterance, 'words')
+    if words:
+        return [{
+            'text': _field(word, 'text'),
+            'speaker': _field(word, 'speaker') or speaker,
+            'start': _field(word, 'start'),
+            'end': _field(word, 'end'),
+        } for word in words]
+
+    texts = _field(utterance, 'text', '').split()
+    start = _field(utterance, 'start', 0)
+    end = _field(utterance, 'end', start)
+    step = (end - start) / max(1, len(texts))
+    return [{
+        'text': text,
+        'speaker': speaker,
+        'start': start + i * step,
+        'end': start + (i + 1) * step,
+    } for i, text in enumerate(texts)]
+
+def chunk_words(transcript, offset_ms):
+    """Flatten a chunk transcript's utterances into words shifted onto the global timeline."""
+    words = []
+    for utterance in _field(transcript, 'utterances') or []:
+        for word in utterance_words(utterance):
+            word['start'] += offset_ms
+            word['end'] += offset_ms
+            words.append(word)
+    return words
+
+def map_speakers(previous, current, blocks):
+    """
+    Map the current chunk's speaker labels onto the labels used so far.
+
+    Labels are matched by majority vote over the aligned words. A speaker with no
+    aligned words keeps its label when that label is still free, otherwise takes a
+    known label no other speaker claimed, and only then gets a fresh label.
+    """
+    votes = {}
+    for a, b, size in blocks:
+        for i in range(size):
+            votes.setdefault(current[b + i]['speaker'], Counter())[previous[a + i]['speaker']] += 1
+
+    mapping = {speaker: counter.most_common(1)[0][0] for speaker, counter in votes.items()}
+    taken = set(mapping.values())
+    known = sorted({word['speaker'] for word in previous})
+
+    for word in current:
+        speaker = word['speaker']
+        if speaker in mapping:
+            continue
+        if speaker not in taken:
+            label = speaker
+        else:
+            free = [label for label in known if label not in taken]
+            if free:
+                label = free[0]
+            else:
+                label, suffix = speaker, 2
+                while label in taken:
+                    label = f"{speaker}{suffix}"
+                    suffix += 1
+        mapping[speaker] = label
+        taken.add(label)
+    return mapping
+
+def merge_words(previous, current, overlap_start_ms, overlap_end_ms, min_match=3, slack_ms=2000):
+    """
+    Merge the words of the next chunk into the words stitched so far.
+
+    The overlapping region is aligned by word sequence, and the duplicate words are
+    dropped at the middle of the longest matching run. When no run of at least
+    min_match words is found, the region is cut at its temporal midpoint instead.
+
+    Returns:
+    - list: The merged words.
+    """
+    tail_start = next((i for i, word in enumerate(previous) if word['start'] >= overlap_start_ms - slack_ms), len(previous))
+    head_end = next((i for i, word in enumerate(current) if word['start'] > overlap_end_ms + slack_ms), len(current))
+    tail = previous[tail_start:]
+    head = current[:head_end]
+
+    matcher = difflib.SequenceMatcher(None, [_normalize(w['text']) for w in tail], [_normalize(w['text']) for w in head], autojunk=False)
+    blocks = [block for block in matcher.get_matching_blocks() if block.size]
+    longest = max(blocks, key=lambda block: block.size, default=None)
+
+    mapping = map_speakers(tail, head, blocks)
+    for word in current:
+        word['speaker'] = mapping.get(word['speaker'], word['speaker'])
+
+    if longest is not None and longest.size >= min(min_match, len(head)):
+        # Keep the earlier chunk up to the middle of the matched run and the later chunk after it
+        middle = longest.size // 2
+        return previous[:tail_start + longest.a + middle] + current[longest.b + middle:]
+
+    cut = (overlap_start_ms + overlap_end_ms) / 2
+    return [word for word in previous if word['start'] < cut] + [word for word in current if word['start'] >= cut]
+
+def group_utterances(words):
+    """Group consecutive words from the same speaker into utterances."""
+    utterances = []
+    for word in words:
+        if utterances and utterances[-1]['speaker'] == word['speaker']:
+            utterance = utterances[-1]
+            utterance['text'] += ' ' + word['text']
+            utterance['end'] = word['end']
+            utterance['words'].append(word)
+        else:
+            utterances.append({
+                'speaker': word['speaker'],
+                'text': word['text'],
+                'start': word['start'],
+                'end': word['end'],
+                'words': [word],
+            })
+    return utterances
+
+def stitch(transcripts, chunks, min_match=3):
+    """
+    Stitch per-chunk transcripts into one utterance stream on the source timeline.
+
+    Args:
+    - transcripts (list): Chunk transcripts (SDK objects or dicts with utterances), in order.
+    - chunks (list): Matching {"start", "end"} entries in seconds, as written by v2a.py to split.json.
+    - min_match (int): Shortest word run accepted as an alignment of an overlap.
+
+    Returns:
+    - list: Utterance dicts with speaker, text, start, end (ms) and words.
+    """
+    merged = []
+    previous_end = None
+    for transcript, chunk in zip(transcripts, chunks):
+        start_ms = chunk['start'] * 1000
+        words = chunk_words(transcript, start_ms)
+        if merged and previous_end is not None and start_ms < previous_end:
+            merged = merge_words(merged, words, start_ms, previous_end, min_match)
+        else:
+            merged.extend(words)
+        previous_end = chunk['end'] * 1000
+    return group_utterances(merged)
+
+class StreamingStitcher:
+    """
+    Stitch chunk transcripts one at a time, as they finish.
+
+    Words are released once no later chunk can overlap them any more, and each
+    utterance is held back until the next speaker starts. The words and their times
+    match what stitch() produces for the whole set, but the speaker labels (and so the
+    utterance grouping) can differ: each chunk's speakers are mapped against the
+    held-back tail only, not against every word stitched so far.
+    """
+
+    def __init__(self, min_match=3, slack_ms=2000):
+        self.min_match = min_match
+        self.slack_ms = slack_ms
+        self._words = []
+        self._open = []
+        self._previous_end = None
+
+    def add(self, transcript, chunk, next_start=None):
+        """
+        Add the next chunk transcript in order.
+
+        Args:
+        - transcript: Chunk transcript (SDK object or dict with utterances).
+        - chunk (dict): Its {"start", "end"} entry in seconds.
+        - next_start (float): Start of the following chunk in seconds, or None for the last chunk.
+
+        Returns:
+        - list: Utterances that are now final.
+        """
+        start_ms = chunk['start'] * 1000
+        words = chunk_words(transcript, start_ms)
+        if self._words and self._previous_end is not None and start_ms < self._previous_end:
+            self._words = merge_words(self._words, words, start_ms, self._previous_end, self.min_match, self.slack_ms)
+        else:
+            self._words.extend(words)
+        self._previous_end = chunk['end'] * 1000
+
+        if next_start is None:
+            final = len(self._words)
+        else:
+            limit = next_start * 1000 - self.slack_ms
+            final = next((i for i, word in enumerate(self._words) if word['start'] >= limit), len(self._words))
+        ready = self._words[:final]
+        self._words = self._words[final:]
+
+        utterances = group_utterances(self._open + ready)
+        self._open = utterances.pop()['words'] if utterances else []
+        return utterances
+
+    def finish(self):
+        """Release everything still held back."""
+        utterances = group_utterances(self._open + self._words)
+        self._open = []
+        self._words = []
+        return utterances
+
+def load_manifest(path):
+    """Load the chunk manifest written by v2a.py."""
+    with open(path, 'r') as manifest:
+        return json.load(manifest)
+
+def main():
+    parser = argparse.ArgumentParser(description='Stitch per-chunk transcripts (JSON) into one transcript, removing the overlap between chunks.')
+    parser.add_argument('transcripts', nargs='+', help='Transcript JSON files, one per chunk, in order.')
+    parser.add_argument('-m', '--manifest', default='split.json', help='Chunk manifest written by v2a.py.')
+    parser.add_argument('-o', '--output', default='transcription.txt', help='The output file name.')
+    args = parser.parse_args()
+
+    transcripts = []
+    for path in args.transcripts:
+        with open(path, 'r') as file:
+            transcripts.append(json.load(file))
+
+    utterances = stitch(transcripts, load_manifest(args.manifest))
+    with open(args.output, 'w') as file:
+        for utterance in utterances:
+            file.write(f"Speaker {utterance['speaker']}: {utterance['text']}\n")
+
+if __name__ == '__main__':
+    main()
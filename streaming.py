@@ -0,0 +1,179 @@
+#!/usr/bin/python3
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+import summarize
+import transcribe
+import v2a
+from mergecore import log, BackoffGate
+from stitch import StreamingStitcher
+from tokencount import TokenChunker, get_token_counter
+
+# Sentinel marking the end of a stage's output
+DONE = object()
+
+def put_until_stopped(channel, item, stopped):
+    """Put an item on a bounded queue, giving up once the pipeline has been stopped."""
+    while not stopped.is_set():
+        try:
+            channel.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def get_until_stopped(channel, stopped):
+    """
+    Take the next item from a queue, or DONE once the pipeline has been stopped.
+
+    A stopped producer may give up before queueing its end marker, so consumers never
+    block on a plain get().
+    """
+    while True:
+        try:
+            return channel.get(timeout=0.5)
+        except queue.Empty:
+            if stopped.is_set():
+                return DONE
+
+def remove_partial(*paths):
+    """Remove the .tmp files of an unfinished run."""
+    for path in paths:
+        if path and os.path.isfile(path + '.tmp'):
+            os.remove(path + '.tmp')
+
+def stream_pipeline(input_file,
+                    output_file,
+                    transcript_file=None,
+                    max_bytes=v2a.target_size,
+                    overlap=v2a.silence_overlap,
+                    silence=True,
+                    transcribe_workers=4,
+                    summarize_workers=4,
+                    queue_size=4,
+                    prompt_max_tokens=2500,
+                    engine="gpt-3.5-turbo-0613",
+                    temperature=0.5,
+                    max_tokens=int(8192 * 0.8),
+                    prompt=summarize.DEFAULT_PROMPT):
+    """
+    Convert, transcribe and summarize with the stages overlapping.
+
+    Each audio segment is handed to transcription as soon as it is written. Finished
+    transcripts are stitched in order and fed to an incremental chunker, and every
+    chunk is summarized as soon as its token budget fills. Bounded queues between the
+    stages keep memory flat and apply back-pressure, and summaries are written (and
+    flushed) in chunk order as they arrive. They go to output_file + '.tmp' (and the
+    transcript to transcript_file + '.tmp'), which replace the final files only when
+    the whole run succeeded, so a failed run never leaves a truncated summary.
+
+    Returns:
+    - int: Number of summaries written.
+    """
+    splits = v2a.plan_chunks(input_file, max_bytes, v2a.bitrate_kbps, overlap, silence)
+    tokens_per_chunk = max(1, prompt_max_tokens - get_token_counter(engine).count(prompt))
+    gate = BackoffGate()
+    stopped = threading.Event()
+    errors = []
+    transcripts = queue.Queue(maxsize=queue_size)
+    summaries = queue.Queue(maxsize=queue_size)
+
+    with ThreadPoolExecutor(max_workers=transcribe_workers) as transcribers, \
+         ThreadPoolExecutor(max_workers=summarize_workers) as summarizers:
+
+        def segment():
+            try:
+                for i, (start, end) in enumerate(splits):
+                    if stopped.is_set():
+                        return
+                    path = v2a.encode_audio(input_file, f"{v2a.chunk_output}_{i}.mp3", start=start, duration=end - start)
+                    log(f"Segment {i} written, submitting it for transcription...")
+                    future = transcribers.submit(metrics.propagate(transcribe.transcribe), path)
+                    if not put_until_stopped(transcripts, (i, future), stopped):
+                        return
+            except Exception as e:
+                errors.append(e)
+                stopped.set()
+            finally:
+                put_until_stopped(transcripts, DONE, stopped)
+
+        def stitch_and_chunk():
+            stitcher = StreamingStitcher()
+            chunker = TokenChunker(tokens_per_chunk, engine)
+            count = 0
+            transcript_out = open(transcript_file + '.tmp', 'w') if transcript_file else None
+
+            def submit(chunks):
+                nonlocal count
+                for text, _ in chunks:
+                    count += 1
+                    future = summarizers.submit(metrics.propagate(summarize.summarize_chunk), count, None, text, prompt, engine,
+                                                temperature, max_tokens, gate)
+                    if not put_until_stopped(summaries, future, stopped):
+                        return
+
+            def feed(utterances):
+                for utterance in utterances:
+                    line = f"Speaker {utterance['speaker']}: {utterance['text']}\n"
+                    if transcript_out:
+                        transcript_out.write(line)
+                    submit(chunker.feed(line))
+
+            try:
+                while True:
+                    item = get_until_stopped(transcripts, stopped)
+                    if item is DONE or stopped.is_set():
+                        break
+                    i, future = item
+                    next_start = splits[i + 1][0] if i + 1 < len(splits) else None
+                    feed(stitcher.add(future.result(), {'start': splits[i][0], 'end': splits[i][1]}, next_start))
+                feed(stitcher.finish())
+                submit(chunker.flush())
+            except Exception as e:
+                errors.append(e)
+                stopped.set()
+            finally:
+                if transcript_out:
+                    transcript_out.close()
+                put_until_stopped(summaries, DONE, stopped)
+
+        threads = [threading.Thread(target=metrics.propagate(segment), daemon=True),
+                   threading.Thread(target=metrics.propagate(stitch_and_chunk), daemon=True)]
+        for thread in threads:
+            thread.start()
+
+        written = 0
+        finished = False
+        try:
+            with open(output_file + '.tmp', 'w') as outfile:
+                while True:
+                    future = get_until_stopped(summaries, stopped)
+                    if future is DONE:
+                        break
+                    outfile.write(future.result() + '\n')
+                    outfile.flush()
+                    written += 1
+                    if written == 1:
+                        log("First summary written.")
+            finished = True
+        except BaseException:
+            stopped.set()
+            transcribers.shutdown(wait=False, cancel_futures=True)
+            summarizers.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            for thread in threads:
+                thread.join()
+            if not finished:
+                remove_partial(output_file, transcript_file)
+
+    if errors:
+        remove_partial(output_file, transcript_file)
+        raise errors[0]
+    if transcript_file:
+        os.replace(transcript_file + '.tmp', transcript_file)
+    os.replace(output_file + '.tmp', output_file)
+    log(f"Streaming pipeline wrote {written} summaries.")
+    return written
@@ -1,17 +1,151 @@
-import json
 import traceback
+import hashlib
+import json
 import os
+import time
 import openai
 import sys
 import argparse
+import threading
+import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
-from mergecore import log, backoff_and_retry
-from tokencount import calculate_tokens
+from concurrent.futures import ThreadPoolExecutor
+import chnk
+import dedup
+import metrics
+import planner
+import transcriptstore
+from mergecore import log, backoff_and_retry, BackoffGate
+from responsecache import ResponseCache
+from tokencount import chunk_by_tokens, get_token_counter
 
 # Load .env file if it exists
 load_dotenv()
 openai.api_key = os.environ.get('OPENAI_KEY')
 
+DEFAULT_PROMPT = "This is a transcribed text (without diarization) from an online video. Could you summarize the main topics or points of view presented by the speakers in bullet point form?"
+REDUCE_PROMPT = "These are bullet point summaries of consecutive parts of a transcribed online video. Could you merge them into a single bullet point summary of the main topics or points of view, without repeating points?"
+
+class SharedHTTPAdapter(HTTPAdapter):
+    """
+    Connection pool shared by the per-thread sessions of the openai module.
+
+    The openai module closes a thread's session once it is a few minutes old; closing
+    this adapter would drop the connections of every other thread, so it stays open.
+    """
+
+    def close(self):
+        pass
+
+# The adapter behind every OpenAI session, once use_pooled_session() has installed it
+_shared_adapter = None
+
+def _pooled_session():
+    session = requests.Session()
+    session.mount('https://', _shared_adapter)
+    session.mount('http://', _shared_adapter)
+    return session
+
+def use_pooled_session(pool_size):
+    """
+    Send every OpenAI request through one shared keep-alive connection pool.
+
+    The openai module keeps one session per thread and creates it through
+    openai.requestssession, so each new thread gets its own session on the shared
+    adapter, whose pool is sized to the concurrency. Connections (and TLS handshakes)
+    are then reused across all chunks and workers. The adapter is only replaced when a
+    larger pool is needed. Threads that already made a request keep their old session,
+    so the requests should be made from new worker threads.
+    """
+    global _shared_adapter
+    if _shared_adapter is None or _shared_adapter._pool_maxsize < pool_size:
+        _shared_adapter = SharedHTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size), max_retries=2)
+    openai.requestssession = _pooled_session
+    return _shared_adapter
+
+class SummaryManifest:
+    """
+    Persisted map from chunk content hashes to their summaries.
+
+    The hash covers the chunk text and the settings that shape its summary (engine,
+    prompt, temperature and max_tokens), but not the chunk's position, so a chunk that
+    only moved because text was inserted before it keeps its summary. save() keeps
+    just the chunks of the latest run.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.summaries = {}
+        self.reused = 0
+        self._lock = threading.Lock()
+        if os.path.isfile(path):
+            with open(path, 'r') as file:
+                self.summaries = {chunk['hash']: chunk['summary'] for chunk in json.load(file)['chunks']}
+
+    @staticmethod
+    def make_key(chunk_text, engine, prompt, temperature, max_tokens):
+        payload = json.dumps({"engine": engine, "prompt": prompt, "temperature": temperature,
+                              "max_tokens": max_tokens, "text": chunk_text}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            summary = self.summaries.get(key)
+            if summary is not None:
+                self.reused += 1
+            return summary
+
+    def put(self, key, summary):
+        with self._lock:
+            self.summaries[key] = summary
+
+    def save(self, keys):
+        """Write the summaries of the given chunk keys, in order, replacing the file atomically."""
+        with self._lock:
+            chunks = [{'hash': key, 'summary': self.summaries[key]} for key in keys if key in self.summaries]
+        with open(self.path + '.tmp', 'w') as file:
+            json.dump({'chunks': chunks}, file, indent=2)
+        os.replace(self.path + '.tmp', self.path)
+
+class OrderedStreamWriter:
+    """
+    Writes streamed summaries to a file in chunk order while they are still arriving.
+
+    Text of the chunk at the head of the order goes straight to the file. Text of later
+    chunks is buffered until every chunk before them has finished. on_token, if given,
+    is called as on_token(idx, text) for every piece as soon as it arrives.
+    """
+
+    def __init__(self, outfile, on_token=None, first=1):
+        self.outfile = outfile
+        self.on_token = on_token
+        self.head = first
+        self._buffers = {}
+        self._finished = set()
+        self._lock = threading.Lock()
+
+    def write(self, idx, text):
+        if self.on_token:
+            self.on_token(idx, text)
+        with self._lock:
+            if idx == self.head:
+                self.outfile.write(text)
+                self.outfile.flush()
+            else:
+                self._buffers.setdefault(idx, []).append(text)
+
+    def finish(self, idx):
+        """Mark a chunk's summary as complete and write whatever it unblocks."""
+        with self._lock:
+            self._finished.add(idx)
+            while self.head in self._finished:
+                self.outfile.write(''.join(self._buffers.pop(self.head, [])) + '\n')
+                self.head += 1
+                # The new head may already have streamed part of its summary
+                self.outfile.write(''.join(self._buffers.pop(self.head, [])))
+            self.outfile.flush()
+
 # Here's the updated version of the generate_summaries function with more logging statements for better visibility into the progress.
 
 def generate_summaries(prompt_max_tokens=2500, 
@@ -21,76 +155,134 @@ def generate_summaries(prompt_max_tokens=2500,
                        engine="gpt-3.5-turbo-0613", 
                        temperature=0.5, 
                        max_tokens=int(8192), 
-                       prompt="This is a transcribed text (without diarization) from an online video. Could you summarize the main topics or points of view presented by the speakers in bullet point form?", 
-                       log_file=None):
+                       prompt=DEFAULT_PROMPT, 
+                       log_file=None,
+                       concurrency=1,
+                       cache_file=None,
+                       cache_max_entries=None,
+                       cache_max_age=None,
+                       reduce=False,
+                       reduce_prompt=REDUCE_PROMPT,
+                       stream=False,
+                       on_token=None,
+                       deduplicate=False,
+                       dedup_corpus=None,
+                       dedup_job=None,
+                       start_ms=None,
+                       end_ms=None,
+                       speaker=None,
+                       manifest_file=None):
 
     if input_file:
         transcript_file = input_file
         try:
-            with open(transcript_file, 'r') as file:
-                data = file.read()
+            # A transcript store gives just the selected time range or speaker
+            data = transcriptstore.read_text(transcript_file, start_ms, end_ms, speaker)
+
+            if deduplicate:
+                log("Removing repeated segments...")
+                corpus = None
+                if dedup_corpus and not dedup_job:
+                    # Without a stable name, each version of a transcript would count as another job
+                    log("No job name given for the boilerplate corpus; only removing repeats within the transcript.")
+                elif dedup_corpus:
+                    corpus = dedup.BoilerplateCorpus(dedup_corpus)
+                try:
+                    with metrics.span('dedup') as span:
+                        data, report = dedup.deduplicate(data, corpus=corpus, job=dedup_job, model=engine)
+                        span.set(tokens_saved=report['tokens_saved'])
+                finally:
+                    if corpus is not None:
+                        corpus.close()
+                dedup.log_report(report)
 
             log("Calculating tokens for prompt...")
-            prompt_token_output = calculate_tokens(prompt, model=engine, json_output=True)
-            if isinstance(prompt_token_output, str):
-                prompt_token_output = json.loads(prompt_token_output)
-            prompt_token_count = prompt_token_output['tokens']
+            prompt_token_count = get_token_counter(engine).count(prompt)
             log(f"Prompt token count: {prompt_token_count}")
 
-            log("Calculating tokens for data...")
-            data_token_output = calculate_tokens(data, model=engine, json_output=True)
-            if isinstance(data_token_output, str):
-                data_token_output = json.loads(data_token_output)
-            data_token_count = data_token_output['tokens']
+            log("Chunking data...")
+            tokens_per_chunk = max(1, prompt_max_tokens - prompt_token_count)
+            if manifest_file:
+                # Content-defined boundaries, so an edit or an append leaves the other chunks unchanged
+                chunks = chnk.anchored_chunks(data, tokens_per_chunk, model=engine)
+            else:
+                chunks = chunk_by_tokens(data, tokens_per_chunk, model=engine)
+            data_token_count = sum(tokens_used for _, tokens_used in chunks)
             log(f"Data token count: {data_token_count}")
 
-            chunks_text = []
-            if prompt_token_count + data_token_count > prompt_max_tokens:
-                tokens_per_chunk = prompt_max_tokens - prompt_token_count
-                start_idx = 0
-
-                log("Starting chunking process...")
-                while start_idx < len(data):
-                    log(f"Getting chunk starting from index {start_idx}...")
-                    chunk, tokens_used = get_chunk(data[start_idx:], tokens_per_chunk, model=engine)
-                    log(f"Chunk obtained with {tokens_used} tokens.")
-                    chunks_text.append(chunk)
-                    start_idx += len(chunk)
+            if len(chunks) > 1:
+                for idx, (_, tokens_used) in enumerate(chunks, start=1):
+                    log(f"Chunk {idx} obtained with {tokens_used} tokens.")
+                chunks_text = [chunk for chunk, _ in chunks]
             else:
                 chunks_text = [data]
 
             log(f"Transcript broken into {len(chunks_text)} chunks.")
-            with open(output_file, 'w') as outfile:
-                for idx, chunk_text in enumerate(chunks_text, start=1):
-                    log(f"Processing chunk {idx}...")
-                    system_message = f"You are a helpful assistant. You are reading chunk {idx} of {len(chunks_text)}."
-                    user_message = f"{prompt} \n\nChunk {idx} of {len(chunks_text)}:\n\n{chunk_text}\n\n"
-                    messages = [
-                        {"role": "system", "content": system_message},
-                        {"role": "user", "content": user_message},
-                    ]
-
-                    log("Calculating message tokens...")
-                    message_token_output = calculate_tokens(messages, model=engine, json_output=True)
-                    if isinstance(message_token_output, str):
-                        message_token_output = json.loads(message_token_output)
-
-                    token_count_for_messages = message_token_output['tokens']
-                    api_max_tokens = max_tokens - token_count_for_messages
-                    api_max_tokens = max(1, min(api_max_tokens, max_tokens))
-
-                    log("Getting response from OpenAI API...")
-                    response = backoff_and_retry(lambda: openai.ChatCompletion.create(
-                        model=engine,
-                        messages=messages,
-                        max_tokens=api_max_tokens,
-                        temperature=temperature
-                    ))
-                    summary = response['choices'][0]['message']['content'].strip()
-
-                    log(f"Summary for chunk {idx}: {summary}")
-                    outfile.write(summary + '\n')
+            gate = BackoffGate()
+            cache = ResponseCache(cache_file, max_entries=cache_max_entries, max_age=cache_max_age) if cache_file else None
+
+            manifest = SummaryManifest(manifest_file) if manifest_file else None
+            keys = [SummaryManifest.make_key(chunk_text, engine, prompt, temperature, max_tokens) for chunk_text in chunks_text] if manifest is not None else []
+
+            use_pooled_session(max(1, concurrency))
+            writer = None
+
+            def process(item):
+                idx, chunk_text = item
+                summary = manifest.get(keys[idx - 1]) if manifest is not None else None
+                if summary is not None:
+                    log(f"Reusing the summary of unchanged chunk {idx}.")
+                    if writer is not None:
+                        writer.write(idx, summary)
+                        writer.finish(idx)
+                    return summary
+                if writer is None:
+                    summary = summarize_chunk(idx, len(chunks_text), chunk_text, prompt, engine, temperature, max_tokens, gate, cache)
+                else:
+                    summary = summarize_chunk(idx, len(chunks_text), chunk_text, prompt, engine, temperature, max_tokens, gate, cache,
+                                              on_token=lambda text: writer.write(idx, text))
+                    writer.finish(idx)
+                if manifest is not None:
+                    manifest.put(keys[idx - 1], summary)
+                return summary
+
+            try:
+                with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+                    # map yields results in chunk order, so summaries are written in order as they complete.
+                    # Even one request at a time goes through a worker, whose session uses the shared pool.
+                    def run(function, items):
+                        return executor.map(metrics.propagate(function), items)
+                    if concurrency > 1:
+                        log(f"Summarizing with up to {concurrency} concurrent requests...")
+                    items = enumerate(chunks_text, start=1)
+                    # Only a complete set of summaries replaces output_file
+                    with open(output_file + '.tmp', 'w') as outfile:
+                        if reduce:
+                            summaries = list(run(process, items))
+                            final = OrderedStreamWriter(outfile, on_token) if stream else None
+                            summary = reduce_summaries(summaries, prompt_max_tokens, engine, temperature, max_tokens,
+                                                       reduce_prompt, run, gate, cache, final)
+                            if final is None:
+                                outfile.write(summary + '\n')
+                        elif stream:
+                            writer = OrderedStreamWriter(outfile, on_token)
+                            for _ in run(process, items):
+                                pass
+                        else:
+                            for summary in run(process, items):
+                                outfile.write(summary + '\n')
+                os.replace(output_file + '.tmp', output_file)
                 log("Summaries generated.")
+            finally:
+                # Keep the summaries that did finish, so a failed run resumes from them
+                if manifest is not None:
+                    manifest.save(keys)
+                    log(f"Summary manifest: reused the summaries of {manifest.reused} of {len(keys)} chunks.")
+
+            if cache is not None:
+                stats = cache.stats()
+                log(f"Response cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries.")
+                cache.close()
 
             if cleanup and input_file:
                 try:
@@ -103,46 +295,205 @@ def generate_summaries(prompt_max_tokens=2500,
             log("Cleanup completed.")
         except Exception as e:
             log(f"Error occurred: {traceback.format_exc()}")
-            return
+            if output_file and os.path.isfile(output_file + '.tmp'):
+                os.remove(output_file + '.tmp')
+            raise
     else:
         log("Error: No input source provided. Please specify an input file.")
         return output_file
 
-# Adding a visual indicator in the get_chunk function to show progress during the chunk size reduction process
+def summarize_chunk(idx, total, chunk_text, prompt, engine, temperature, max_tokens, gate=None, cache=None, on_token=None):
+    """
+    Summarize a single chunk of the transcript.
 
-# Implementing the binary search approach in the get_chunk function
+    Parameters:
+    - idx (int): 1-based position of the chunk.
+    - total (int): Total number of chunks, or None when it is not known yet (streaming).
+    - chunk_text (str): Text of the chunk.
+    - prompt (str): Summarization prompt.
+    - engine (str): Model to use.
+    - temperature (float): Sampling temperature.
+    - max_tokens (int): Token budget shared by the messages and the completion.
+    - gate (BackoffGate): Optional gate shared by concurrent workers for rate-limit backoff.
+    - cache (ResponseCache): Optional on-disk cache consulted before calling the API.
+    - on_token (callable): When given, the response is streamed and on_token(text) is called
+      with every piece as it arrives (or once with the whole summary on a cache hit).
 
-# Correcting the mistake in the get_chunk function
+    Returns:
+    - str: The summary text.
+    """
+    with metrics.span('summarize_chunk', chunk=idx, total=total, engine=engine) as span:
+        log(f"Processing chunk {idx}...")
+        position = f"{idx} of {total}" if total is not None else f"{idx}"
+        system_message = f"You are a helpful assistant. You are reading chunk {position}."
+        user_message = f"{prompt} \n\nChunk {position}:\n\n{chunk_text}\n\n"
+        messages = [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": user_message},
+        ]
 
-def get_chunk(text, max_tokens, model):
-    left = 0
-    right = len(text)
-    
-    while left < right:
-        middle = (left + right) // 2
-        chunk = text[:middle]
-        
-        token_output = calculate_tokens(chunk, model=model, json_output=True)
-        if isinstance(token_output, str):
-            token_output = json.loads(token_output)
-        
-        tokens_in_chunk = token_output['tokens']
-        
-        if tokens_in_chunk == max_tokens:
-            return chunk, tokens_in_chunk
-        elif tokens_in_chunk < max_tokens:
-            left = middle + 1
+        log(f"Calculating message tokens for chunk {idx}...")
+        token_count_for_messages = get_token_counter(engine).count_messages(messages)
+        api_max_tokens = max_tokens - token_count_for_messages
+        api_max_tokens = max(1, min(api_max_tokens, max_tokens))
+        span.set(tokens_in=token_count_for_messages)
+
+        log(f"Getting response from OpenAI API for chunk {idx}...")
+        started = time.perf_counter()
+        streamed = False
+
+        def api_call():
+            nonlocal streamed
+            response = backoff_and_retry(lambda: openai.ChatCompletion.create(
+                model=engine,
+                messages=messages,
+                max_tokens=api_max_tokens,
+                temperature=temperature,
+                stream=on_token is not None
+            ), gate=gate)
+            if on_token is None:
+                return response
+
+            parts = []
+            # Trailing whitespace is held back until more text follows, so the streamed text
+            # matches the stripped text of a non-streamed summary
+            pending = ''
+            for event in response:
+                piece = event['choices'][0].get('delta', {}).get('content')
+                if not piece:
+                    continue
+                if not streamed:
+                    piece = piece.lstrip()
+                    if not piece:
+                        continue
+                    span.set(first_token_seconds=round(time.perf_counter() - started, 6))
+                    streamed = True
+                text = pending + piece
+                piece = text.rstrip()
+                pending = text[len(piece):]
+                if piece:
+                    on_token(piece)
+                    parts.append(piece)
+            # Same shape as a full response, so it can be cached
+            return {'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': ''.join(parts)}, 'finish_reason': 'stop'}]}
+
+        if cache is not None:
+            key = ResponseCache.make_key(engine, messages, temperature, api_max_tokens)
+            response = cache.get_or_call(key, api_call)
+        else:
+            response = api_call()
+        span.set(api_seconds=round(time.perf_counter() - started, 6))
+        summary = response['choices'][0]['message']['content'].strip()
+        if on_token is not None and not streamed and summary:
+            on_token(summary)
+        usage = response.get('usage') or {}
+        span.set(tokens_out=usage.get('completion_tokens') or get_token_counter(engine).count_text(summary))
+
+        log(f"Summary for chunk {idx}: {summary}")
+        return summary
+
+def group_by_tokens(texts, max_tokens, model, separator="\n\n"):
+    """
+    Pack consecutive texts into groups whose combined token count stays within max_tokens.
+
+    A text larger than the budget gets a group of its own. If no two neighbours fit
+    together, they are paired anyway so that every reduce level at least halves the count.
+
+    Returns:
+    - list: Groups of texts, in order.
+    """
+    counter = get_token_counter(model)
+    separator_tokens = counter.count_text(separator)
+    groups = []
+    group_tokens = 0
+    for text, tokens in zip(texts, counter.encoding.encode_batch(texts, disallowed_special=())):
+        tokens = len(tokens)
+        if groups and group_tokens + separator_tokens + tokens <= max_tokens:
+            groups[-1].append(text)
+            group_tokens += separator_tokens + tokens
         else:
-            right = middle - 1
+            groups.append([text])
+            group_tokens = tokens
+    if len(groups) == len(texts) and len(texts) > 1:
+        groups = [texts[i:i + 2] for i in range(0, len(texts), 2)]
+    return groups
+
+def reduce_summaries(summaries,
+                     prompt_max_tokens=2500,
+                     engine="gpt-3.5-turbo-0613",
+                     temperature=0.5,
+                     max_tokens=int(8192),
+                     prompt=REDUCE_PROMPT,
+                     run=map,
+                     gate=None,
+                     cache=None,
+                     writer=None):
+    """
+    Tree-reduce chunk summaries into one.
+
+    Summaries are grouped under the same token budget the chunks were cut with, and
+    every group of a level is summarized at once through run, so the number of levels
+    grows with the logarithm of the number of chunks.
+
+    Parameters:
+    - summaries (list): Chunk summaries, in order.
+    - prompt_max_tokens (int): Token budget for the prompt and the grouped summaries.
+    - engine (str): Model to use.
+    - temperature (float): Sampling temperature.
+    - max_tokens (int): Token budget shared by the messages and the completion.
+    - prompt (str): Prompt asking to merge the summaries.
+    - run (callable): map-like function used for each level, e.g. ThreadPoolExecutor.map.
+    - gate (BackoffGate): Optional gate shared by concurrent workers for rate-limit backoff.
+    - cache (ResponseCache): Optional on-disk cache consulted before calling the API.
+    - writer (OrderedStreamWriter): When given, the final merge is streamed into it.
+
+    Returns:
+    - str: The final summary.
+    """
+    if not summaries:
+        return ""
+    tokens_per_group = max(1, prompt_max_tokens - get_token_counter(engine).count(prompt))
+    level = 0
+    while len(summaries) > 1:
+        level += 1
+        groups = group_by_tokens(summaries, tokens_per_group, engine)
+        log(f"Reduce level {level}: merging {len(summaries)} summaries into {len(groups)}.")
+
+        def process(item):
+            idx, group = item
+            if writer is None or len(groups) > 1:
+                return summarize_chunk(idx, len(groups), "\n\n".join(group), prompt, engine, temperature, max_tokens, gate, cache)
+            summary = summarize_chunk(idx, len(groups), "\n\n".join(group), prompt, engine, temperature, max_tokens, gate, cache,
+                                      on_token=lambda text: writer.write(writer.head, text))
+            writer.finish(writer.head)
+            return summary
 
-    # Corrected the JSON parsing before accessing the 'tokens' field
-    final_chunk = text[:left]
-    final_token_output = calculate_tokens(final_chunk, model=model, json_output=True)
-    if isinstance(final_token_output, str):
-        final_token_output = json.loads(final_token_output)
-    final_tokens_in_chunk = final_token_output['tokens']
-    
-    return final_chunk, final_tokens_in_chunk
+        with metrics.span('reduce_level', level=level, chunks=len(groups)):
+            summaries = list(run(process, enumerate(groups, start=1)))
+    if writer is not None and level == 0:
+        # A single chunk summary is already the final one
+        writer.write(writer.head, summaries[0])
+        writer.finish(writer.head)
+    return summaries[0]
+
+def get_chunk(text, max_tokens, model):
+    """
+    Return the leading chunk of text that fits within max_tokens, with its token count.
+
+    Only a prefix of the text is encoded: about eight characters per token of budget,
+    doubled until it holds the budget plus a margin (or the whole text). Only the last
+    word of a cut prefix can encode differently than in the full text, so the chunk is
+    the same as the first one chunk_by_tokens() gives for the whole text.
+    """
+    size = max(1, max_tokens) * 8
+    while True:
+        prefix = text[:size]
+        chunks = chunk_by_tokens(prefix, max_tokens, model=model)
+        if not chunks:
+            return "", 0
+        if size >= len(text) or sum(count for _, count in chunks) > max_tokens + 64:
+            return chunks[0]
+        size *= 2
 
 def cli_main():
     parser = argparse.ArgumentParser(description='Generate summaries from text chunks.')
@@ -153,11 +504,40 @@ def cli_main():
     parser.add_argument('--engine', default="gpt-3.5-turbo-0613", help='Specify the engine to be used.')
     parser.add_argument('--temperature', type=float, default=0.5, help='Specify the temperature.')
     parser.add_argument('--max_tokens', type=int, default=int(8192 * 0.8), help='Specify max tokens.')
-    parser.add_argument('--prompt', default="This is a transcribed text (without diarization) from an online video. Could you summarize the main topics or points of view presented by the speakers in bullet point form?", help='Specify the prompt.')
+    parser.add_argument('--prompt', default=DEFAULT_PROMPT, help='Specify the prompt.')
     parser.add_argument('--log_file', help='Specify a log file to which output will be logged.')
+    parser.add_argument('--concurrency', type=int, default=1, help='Specify how many chunks to summarize in parallel.')
+    parser.add_argument('--cache_file', help='Specify a SQLite file used to cache API responses across runs.')
+    parser.add_argument('--cache_max_entries', type=int, default=None, help='Specify the maximum number of cached responses to keep.')
+    parser.add_argument('--cache_max_age', type=float, default=None, help='Specify the maximum age of cached responses in seconds.')
+    parser.add_argument('--plan', action='store_true', help='Let the planner choose the engine, prompt_max_tokens, max_tokens and concurrency.')
+    parser.add_argument('--dry_run', action='store_true', help='With --plan, print the plan and its reasoning without summarizing.')
+    parser.add_argument('--limits', help='JSON file with measured or configured per-model limits for --plan.')
+    parser.add_argument('--stream', action='store_true', help='Stream the responses and write summaries to the output file as they arrive.')
+    parser.add_argument('--reduce', action='store_true', help='Merge the chunk summaries level by level into a single summary.')
+    parser.add_argument('--reduce_prompt', default=REDUCE_PROMPT, help='Specify the prompt used to merge summaries.')
+    parser.add_argument('--dedup', action='store_true', help='Drop repeated and near-duplicate segments before chunking.')
+    parser.add_argument('--dedup_corpus', help='With --dedup, a SQLite file of boilerplate shared across runs.')
+    parser.add_argument('--dedup_job', help='Name of this transcript in the boilerplate corpus. Defaults to the absolute input path.')
+    parser.add_argument('--start', help='With a transcript store as input, start of the range to summarize, in seconds or [HH:]MM:SS.')
+    parser.add_argument('--end', help='With a transcript store as input, end of the range to summarize.')
+    parser.add_argument('--speaker', help='With a transcript store as input, only summarize this speaker.')
+    parser.add_argument('--manifest', help='JSON file mapping chunk hashes to summaries; a rerun only summarizes new or changed chunks. Chunks are content-defined and about a third more numerous on a first run.')
     parser.set_defaults(cleanup=False)
     args = parser.parse_args()
 
+    if args.plan:
+        text = transcriptstore.read_text(args.input_file, transcriptstore.parse_time(args.start),
+                                         transcriptstore.parse_time(args.end), args.speaker)
+        plan = planner.plan_for_text(text, args.prompt, planner.load_limits(args.limits) if args.limits else None)
+        planner.print_plan(plan)
+        if args.dry_run:
+            return
+        args.engine = plan['model']
+        args.prompt_max_tokens = plan['prompt_max_tokens']
+        args.max_tokens = plan['max_tokens']
+        args.concurrency = plan['concurrency']
+
     openai.api_key = os.getenv('OPENAI_KEY')
     if openai.api_key is None:
         log("Error: OpenAI API key not found. Please make sure the OPENAI_KEY environment variable is set.")
@@ -172,7 +552,21 @@ def cli_main():
         temperature=args.temperature,
         max_tokens=args.max_tokens,
         prompt=args.prompt,
-        log_file=args.log_file
+        log_file=args.log_file,
+        concurrency=args.concurrency,
+        cache_file=args.cache_file,
+        cache_max_entries=args.cache_max_entries,
+        cache_max_age=args.cache_max_age,
+        reduce=args.reduce,
+        reduce_prompt=args.reduce_prompt,
+        stream=args.stream,
+        deduplicate=args.dedup,
+        dedup_corpus=args.dedup_corpus,
+        dedup_job=args.dedup_job or (os.path.abspath(args.input_file) if args.input_file else None),
+        start_ms=transcriptstore.parse_time(args.start),
+        end_ms=transcriptstore.parse_time(args.end),
+        speaker=args.speaker,
+        manifest_file=args.manifest
     )
 
 if __name__ == "__main__":
@@ -180,4 +574,4 @@ if __name__ == "__main__":
         cli_main()
     except Exception as e:
         print(f"Error occurred: {e}")
-        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,32 @@
+import random
+
+# Vocabulary for synthetic speech
+WORDS = ("the", "market", "model", "people", "think", "really", "going", "data", "video", "question",
+         "because", "time", "actually", "point", "system", "money", "problem", "right", "know", "about")
+
+def synthetic_transcript(words, speakers=2, seed=0):
+    """
+    Generate a deterministic diarized transcript in the "Speaker X: text" format.
+
+    Args:
+    - words (int): Approximate number of words.
+    - speakers (int): Number of speakers taking turns.
+    - seed (int): Seed for the word choices.
+
+    Returns:
+    - str: The transcript text.
+    """
+    rng = random.Random(seed)
+    lines = []
+    written = 0
+    turn = 0
+    while written < words:
+        sentences = []
+        for _ in range(rng.randint(1, 4)):
+            length = rng.randint(6, 18)
+            sentence = ' '.join(rng.choice(WORDS) for _ in range(length))
+            sentences.append(sentence.capitalize() + rng.choice('..?!'))
+            written += length
+        lines.append(f"Speaker {chr(ord('A') + turn % speakers)}: {' '.join(sentences)}")
+        turn += 1
+    return '\n'.join(lines) + '\n'
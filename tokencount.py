@@ -1,7 +1,11 @@
 import argparse
+import hashlib
 import json
 import tiktoken
 
+# Token suffixes treated as sentence breaks by chunk_by_tokens
+SENTENCE_ENDINGS = (b".", b"!", b"?", b'."', b'?"', b'!"')
+
 # Dictionary mapping model names to their behaviors
 model_behavior = {'gpt-3.5-turbo-0613': {'tokens_per_message': 3, 'tokens_per_name': 1}, 'gpt-3.5-turbo-16k-0613': {'tokens_per_message': 3, 'tokens_per_name': 1}, 'gpt-4-0314': {'tokens_per_message': 3, 'tokens_per_name': 1}, 'gpt-4-32k-0314': {'tokens_per_message': 3, 'tokens_per_name': 1}, 'gpt-4-0613': {'tokens_per_message': 3, 'tokens_per_name': 1}, 'gpt-4-32k-0613': {'tokens_per_message': 3, 'tokens_per_name': 1}, 'gpt-3.5-turbo-0301': {'tokens_per_message': 4, 'tokens_per_name': -1}}
 
@@ -19,14 +23,8 @@ def get_encoding_for_model(model, json_output=False):
         output_message("Warning: model not found. Using cl100k_base encoding.", json_output)
         return tiktoken.get_encoding("cl100k_base")
 
-def enhanced_num_tokens_from_messages(messages, model="gpt-3.5-turbo-0613", json_output=False):
-    """Calculate the number of tokens for given messages and model."""
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        output_message("Warning: model not found. Using cl100k_base encoding.", json_output)
-        encoding = tiktoken.get_encoding("cl100k_base")
-
+def get_message_overhead(model, json_output=False):
+    """Get the (tokens_per_message, tokens_per_name) overhead for the given model."""
     tokens_per_message = 2  # Default values
     tokens_per_name = 1
 
@@ -46,16 +44,210 @@ def enhanced_num_tokens_from_messages(messages, model="gpt-3.5-turbo-0613", json
         error_msg = f"""num_tokens_from_messages() is not implemented for model {model}. Using default token counts."""
         output_message(error_msg, json_output)
 
-    num_tokens = 0
-    for message in messages:
-        num_tokens += tokens_per_message
-        for key, value in message.items():
-            num_tokens += len(encoding.encode(value))
-            if key == "name":
-                num_tokens += tokens_per_name
-    num_tokens += 3  # every reply is primed with <assistant>
+    return tokens_per_message, tokens_per_name
+
+class TokenCounter:
+    """
+    Token counter bound to one model.
+
+    The encoding and the per-message overhead are resolved once when the counter
+    is built, so repeated counts skip the model lookup. Use get_token_counter()
+    to share one counter per model across the process.
+    """
+
+    def __init__(self, model="gpt-3.5-turbo-0613"):
+        self.model = model
+        self.encoding = get_encoding_for_model(model)
+        self.tokens_per_message, self.tokens_per_name = get_message_overhead(model)
+
+    def count_text(self, text):
+        """Return the number of tokens in a plain string, without message overhead."""
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def count_messages(self, messages):
+        """Return the number of tokens a list of chat messages uses, including message overhead."""
+        num_tokens = 0
+        for message in messages:
+            num_tokens += self.tokens_per_message
+            for key, value in message.items():
+                num_tokens += self.count_text(value)
+                if key == "name":
+                    num_tokens += self.tokens_per_name
+        num_tokens += 3  # every reply is primed with <assistant>
+        return num_tokens
+
+    def count(self, data):
+        """Return the token count for plain text or a list of messages, as calculate_tokens does."""
+        if isinstance(data, str):
+            data = [{"role": "system", "content": data}]
+        return self.count_messages(data)
+
+    def count_batch(self, items, num_threads=8):
+        """
+        Count tokens for many texts or message lists with one encode_batch call.
+
+        Parameters:
+        - items (list): Plain strings or lists of messages, counted as count() would.
+        - num_threads (int): Threads tiktoken uses for the batch encode.
+
+        Returns:
+        - list of int: One token count per item, in order.
+        """
+        message_lists = [[{"role": "system", "content": data}] if isinstance(data, str) else data for data in items]
+        texts = [value for messages in message_lists for message in messages for value in message.values()]
+        encoded = iter(self.encoding.encode_batch(texts, num_threads=num_threads, disallowed_special=()))
+
+        results = []
+        for messages in message_lists:
+            num_tokens = 3  # every reply is primed with <assistant>
+            for message in messages:
+                num_tokens += self.tokens_per_message
+                for key in message:
+                    num_tokens += len(next(encoded))
+                    if key == "name":
+                        num_tokens += self.tokens_per_name
+            results.append(num_tokens)
+        return results
+
+# One shared counter per model, built on first use
+_token_counters = {}
+
+def get_token_counter(model="gpt-3.5-turbo-0613"):
+    """Return the shared TokenCounter for the given model."""
+    counter = _token_counters.get(model)
+    if counter is None:
+        counter = _token_counters.setdefault(model, TokenCounter(model))
+    return counter
+
+def enhanced_num_tokens_from_messages(messages, model="gpt-3.5-turbo-0613", json_output=False):
+    """Calculate the number of tokens for given messages and model."""
+    return get_token_counter(model).count_messages(messages)
+
+def _is_break_token(encoding, token):
+    """Check whether a token ends a sentence or an utterance line."""
+    piece = encoding.decode_single_token_bytes(token)
+    return b"\n" in piece or piece.rstrip().endswith(SENTENCE_ENDINGS)
+
+def chunk_by_tokens(text, max_tokens, model="gpt-3.5-turbo-0613"):
+    """
+    Split text into chunks of at most max_tokens tokens with a single encoding pass.
+
+    The text is encoded once and cut on token boundaries. Each cut snaps back to the
+    nearest utterance (newline) or sentence break inside the budget, and falls back to
+    a hard cut when the window holds no break at all.
+
+    Parameters:
+    - text (str): Text to split.
+    - max_tokens (int): Maximum number of tokens per chunk.
+    - model (str): Model name whose encoding is used.
+
+    Returns:
+    - list: (chunk_text, token_count) tuples covering the whole text in order.
+    """
+    if max_tokens < 1:
+        raise ValueError("max_tokens must be at least 1")
+
+    encoding = get_token_counter(model).encoding
+    tokens = encoding.encode(text, disallowed_special=())
+    _, offsets = encoding.decode_with_offsets(tokens)
+    offsets.append(len(text))
+
+    chunks = []
+    start = 0
+    while start < len(tokens):
+        end = min(start + max_tokens, len(tokens))
+        if end < len(tokens):
+            # Walk back to the last break in the window, without giving up more than half of it
+            cut = end
+            floor = start + max(1, max_tokens // 2)
+            while cut > floor and not _is_break_token(encoding, tokens[cut - 1]):
+                cut -= 1
+            if cut > floor:
+                end = cut
+        chunks.append((text[offsets[start]:offsets[end]], end - start))
+        start = end
+
+    return chunks
+
+class TokenChunker:
+    """
+    Incremental chunker for text that arrives piece by piece.
+
+    Pieces (ideally whole sentences or utterance lines) are buffered until the next one
+    would overflow the token budget, at which point the buffered text is emitted as a
+    chunk. A piece longer than the whole budget is split with chunk_by_tokens.
+    """
+
+    def __init__(self, max_tokens, model="gpt-3.5-turbo-0613"):
+        if max_tokens < 1:
+            raise ValueError("max_tokens must be at least 1")
+        self.max_tokens = max_tokens
+        self.model = model
+        self.counter = get_token_counter(model)
+        self._pieces = []
+        self._tokens = 0
+
+    def feed(self, text):
+        """
+        Add a piece of text.
+
+        Returns:
+        - list: (chunk_text, token_count) tuples for the chunks that filled up.
+        """
+        ready = []
+        tokens = self.counter.count_text(text)
+        self.last_tokens = tokens
+        if self._tokens + tokens > self.max_tokens:
+            ready.extend(self.flush())
+        if tokens > self.max_tokens:
+            pieces = chunk_by_tokens(text, self.max_tokens, self.model)
+            ready.extend(pieces[:-1])
+            text, tokens = pieces[-1]
+        self._pieces.append(text)
+        self._tokens += tokens
+        return ready
+
+    def flush(self):
+        """Emit whatever is buffered as a final chunk."""
+        if not self._pieces:
+            return []
+        chunk = ("".join(self._pieces), self._tokens)
+        self._pieces = []
+        self._tokens = 0
+        return [chunk]
+
+class AnchoredChunker(TokenChunker):
+    """
+    Content-defined variant of TokenChunker whose boundaries survive local edits.
 
-    return num_tokens
+    Besides cutting when the budget is full, a chunk ends after any piece whose hash
+    marks it as an anchor, once the chunk holds at least min_tokens. The decision
+    depends only on the piece itself, so an edit moves the boundaries of its own chunk
+    and the chunks up to the next anchor, while the rest keep their exact text. Feed it
+    whole sentences so that boundaries fall on sentence breaks.
+
+    Chunks aim at target_tokens (0.8 * max_tokens by default) and never exceed
+    max_tokens, so a fresh run makes about a third more chunks (and requests) than
+    TokenChunker, which fills every chunk. A target closer to max_tokens makes more
+    chunks end at the cap instead of at an anchor, and such cuts shift with edits.
+    """
+
+    def __init__(self, max_tokens, model="gpt-3.5-turbo-0613", min_tokens=None, target_tokens=None):
+        super().__init__(max_tokens, model)
+        self.min_tokens = min_tokens if min_tokens is not None else max_tokens // 2
+        self.target_tokens = target_tokens if target_tokens is not None else int(max_tokens * 0.8)
+
+    def is_anchor(self, text, tokens):
+        """Pick anchors with a probability per token that makes chunks average about target_tokens."""
+        digest = hashlib.blake2b(' '.join(text.split()).encode('utf-8'), digest_size=8).digest()
+        span = max(1, self.target_tokens - self.min_tokens)
+        return int.from_bytes(digest, 'big') < (1 << 64) * min(1.0, tokens / span)
+
+    def feed(self, text):
+        ready = super().feed(text)
+        if self._tokens >= self.min_tokens and self.is_anchor(text, self.last_tokens):
+            ready.extend(self.flush())
+        return ready
 
 def print_output(tokens, filepath, model, json_output=False):
     """Function to print the output in the desired format."""
@@ -85,11 +277,7 @@ def calculate_tokens(data, model="gpt-3.5-turbo-0613", json_output=False):
     Returns:
     - int or str: Token count (as integer) or JSON formatted string based on json_output flag.
     """
-    # Handle plain text input
-    if isinstance(data, str):
-        data = [{"role": "system", "content": data}]
-
-    tokens = enhanced_num_tokens_from_messages(data, model, json_output)
+    tokens = get_token_counter(model).count(data)
     if json_output:
         return json.dumps({"tokens": tokens})
     return tokens
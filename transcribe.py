@@ -1,49 +1,98 @@
 import argparse
 import os
 import assemblyai as aai
+import metrics
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from stitch import stitch, load_manifest
 
 # Load .env file and get the API key
 load_dotenv()
 aai.settings.api_key = os.getenv('ASSEMBLYAI_KEY')
 
-def transcribe(file_path, speaker_labels=True):
+# Point the SDK at a local stand-in for the AssemblyAI API when one is configured
+if os.getenv('ASSEMBLYAI_BASE_URL'):
+    aai.settings.base_url = os.getenv('ASSEMBLYAI_BASE_URL')
+
+def transcribe_files(file_paths, speaker_labels=True, max_workers=8, poll_interval=None):
+    """
+    Transcribe several audio files at once.
+
+    Each worker uploads and submits one file, then sleeps in the SDK's status polling
+    until that transcript finishes, so waiting costs no CPU. With max_workers at least
+    the number of files, every chunk is submitted up front.
+
+    Args:
+    - file_paths (list): Audio files to transcribe, e.g. the split_*.mp3 chunks.
+    - speaker_labels (bool): Whether to request diarization.
+    - max_workers (int): Maximum number of transcriptions in flight.
+    - poll_interval (float): Seconds between status polls; the SDK default is used when None.
+
+    Returns:
+    - list: Completed transcripts, in the order of file_paths.
+    """
+    if poll_interval is not None:
+        aai.settings.polling_interval = poll_interval
+
     # Configuration for transcription with diarization
     config = aai.TranscriptionConfig(speaker_labels=speaker_labels)
 
     # Create a transcriber object
     transcriber = aai.Transcriber()
 
-    # Transcribe the audio file
-    transcript = transcriber.transcribe(file_path, config=config)
+    def transcribe_one(path):
+        with metrics.span('transcribe_file', file=path, bytes=os.path.getsize(path)) as span:
+            transcript = transcriber.transcribe(path, config=config)
+            span.set(status=getattr(transcript.status, 'value', transcript.status))
+            return transcript
+
+    workers = max(1, min(max_workers, len(file_paths)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        transcripts = list(executor.map(metrics.propagate(transcribe_one), file_paths))
 
-    # Wait for the transcription to complete
-    while transcript.status != 'completed':
-        # Implement a suitable wait mechanism, e.g., sleep
-        pass
+    for path, transcript in zip(file_paths, transcripts):
+        if transcript.status == aai.TranscriptStatus.error:
+            raise RuntimeError(f"Transcription of {path} failed: {transcript.error}")
 
-    return transcript
+    return transcripts
+
+def transcribe(file_path, speaker_labels=True):
+    """Transcribe a single audio file and return the completed transcript."""
+    return transcribe_files([file_path], speaker_labels=speaker_labels)[0]
 
 def main():
     # Set up argument parsing
     parser = argparse.ArgumentParser(description="Transcribe audio files using AssemblyAI.")
-    parser.add_argument('file_path', help="Path to the audio file for transcription")
+    parser.add_argument('file_paths', nargs='*', help="Paths of the audio files for transcription, e.g. split_*.mp3")
+    parser.add_argument('--manifest', help="Chunk manifest written by v2a.py (split.json); its chunks are transcribed and stitched together")
     parser.add_argument('--output', choices=['console', 'file', 'both'], default='console', 
                         help="Output transcription to console, file, or both")
+    parser.add_argument('--workers', type=int, default=8, help="Maximum number of files transcribed at the same time")
+    parser.add_argument('--poll_interval', type=float, default=None, help="Seconds between transcription status polls")
     args = parser.parse_args()
 
-    # Transcribe the audio file
-    transcript = transcribe(args.file_path)
+    chunks = load_manifest(args.manifest) if args.manifest else None
+    file_paths = args.file_paths or [chunk['file'] for chunk in chunks or []]
+    if not file_paths:
+        parser.error("provide audio files or --manifest")
+
+    # Transcribe the audio files concurrently, keeping their order
+    transcripts = transcribe_files(file_paths, max_workers=args.workers, poll_interval=args.poll_interval)
+    if chunks:
+        # Shift the chunks onto one timeline and drop the speech duplicated by their overlap
+        lines = [f"Speaker {utterance['speaker']}: {utterance['text']}" for utterance in stitch(transcripts, chunks)]
+    else:
+        lines = [f"Speaker {utterance.speaker}: {utterance.text}" for transcript in transcripts for utterance in transcript.utterances]
 
     # Output handling
     if args.output in ['console', 'both']:
-        for utterance in transcript.utterances:
-            print(f"Speaker {utterance.speaker}: {utterance.text}")
+        for line in lines:
+            print(line)
 
     if args.output in ['file', 'both']:
         with open('transcription.txt', 'w') as file:
-            for utterance in transcript.utterances:
-                file.write(f"Speaker {utterance.speaker}: {utterance.text}\n")
+            for line in lines:
+                file.write(line + "\n")
 
 if __name__ == '__main__':
     main()
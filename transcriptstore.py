@@ -0,0 +1,308 @@
+#!/usr/bin/python3
+import argparse
+import array
+import bisect
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+
+MAGIC = b'V2ST'
+VERSION = 1
+
+# Header: magic, version, length of the JSON section table that follows
+_PREFIX = struct.Struct('<4sII')
+
+# Column name -> array typecode. Times are in ms, offsets are bytes into the text blob.
+COLUMNS = {
+    'start': 'I',           # utterance start
+    'end': 'I',             # utterance end
+    'speaker': 'H',         # utterance speaker id, an index into the speaker table
+    'text_offset': 'Q',     # utterance text start, one extra entry for the end of the last one
+    'word_index': 'Q',      # first word of each utterance, one extra entry for the total
+    'word_start': 'I',
+    'word_end': 'I',
+    'word_offset': 'Q',     # word text start, one extra entry for the end of the last one
+    'speaker_index': 'Q',   # utterance ids grouped by speaker, see the speakers table
+}
+
+LINE_FORMAT = re.compile(r'^Speaker ([^:]{1,20}): (.*)$')
+
+def _align(offset, size=8):
+    return (offset + size - 1) // size * size
+
+def write_store(utterances, path):
+    """
+    Write utterances to a compact transcript store.
+
+    The file holds one array per column and a UTF-8 text blob, so a reader can map it
+    and look up utterances by time or speaker without parsing the rest.
+
+    Args:
+    - utterances (iterable): Dicts with speaker, text, start and end (ms), and optionally
+      words (dicts with text, start and end), as stitch.stitch() returns them.
+    - path (str): Output file.
+
+    Returns:
+    - int: Number of utterances written.
+    """
+    columns = {name: array.array(typecode) for name, typecode in COLUMNS.items()}
+    speakers = {}
+    blob = bytearray()
+    for utterance in utterances:
+        speaker = speakers.setdefault(str(utterance['speaker']), len(speakers))
+        columns['start'].append(int(utterance.get('start') or 0))
+        columns['end'].append(int(utterance.get('end') or 0))
+        columns['speaker'].append(speaker)
+        columns['text_offset'].append(len(blob))
+        columns['word_index'].append(len(columns['word_start']))
+
+        words = utterance.get('words') or []
+        if words:
+            for i, word in enumerate(words):
+                columns['word_start'].append(int(word['start']))
+                columns['word_end'].append(int(word['end']))
+                columns['word_offset'].append(len(blob))
+                blob += (word['text'] if i == 0 else ' ' + word['text']).encode('utf-8')
+        else:
+            blob += utterance['text'].encode('utf-8')
+        blob += b'\n'
+    columns['text_offset'].append(len(blob))
+    columns['word_index'].append(len(columns['word_start']))
+    columns['word_offset'].append(len(blob))
+
+    # Utterance ids per speaker, so one speaker's turns are found without a scan
+    table = []
+    for speaker, number in sorted(speakers.items(), key=lambda item: item[1]):
+        ids = [i for i, value in enumerate(columns['speaker']) if value == number]
+        table.append({'name': speaker, 'first': len(columns['speaker_index']), 'count': len(ids)})
+        columns['speaker_index'].extend(ids)
+
+    # Lay out the sections after the header, each aligned for its typecode
+    sections = {}
+    offset = 0
+    for name, values in columns.items():
+        sections[name] = [offset, len(values)]
+        offset = _align(offset + len(values) * values.itemsize)
+    sections['text'] = [offset, len(blob)]
+    header = {'byteorder': sys.byteorder, 'utterances': len(columns['start']), 'speakers': table,
+              'typecodes': {name: values.typecode for name, values in columns.items()},
+              'itemsizes': {name: values.itemsize for name, values in columns.items()}, 'sections': sections}
+    header_bytes = json.dumps(header).encode('utf-8')
+    base = _align(_PREFIX.size + len(header_bytes))
+
+    with open(path + '.tmp', 'wb') as file:
+        file.write(_PREFIX.pack(MAGIC, VERSION, len(header_bytes)) + header_bytes)
+        for name, values in columns.items():
+            file.seek(base + sections[name][0])
+            values.tofile(file)
+        file.seek(base + sections['text'][0])
+        file.write(blob)
+    os.replace(path + '.tmp', path)
+    return header['utterances']
+
+def parse_lines(lines):
+    """Read "Speaker X: text" lines (a transcription.txt) into utterances without times."""
+    for line in lines:
+        line = line.rstrip('\n')
+        match = LINE_FORMAT.match(line)
+        if match:
+            yield {'speaker': match.group(1), 'text': match.group(2), 'start': 0, 'end': 0}
+        elif line:
+            yield {'speaker': '?', 'text': line, 'start': 0, 'end': 0}
+
+def is_store(path):
+    """Check whether a file is a transcript store rather than a plain transcript."""
+    try:
+        with open(path, 'rb') as file:
+            return file.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+class TranscriptStore:
+    """
+    Read-only view of a transcript store.
+
+    The file is memory-mapped, and each column is a zero-copy typed view into the map,
+    so opening a multi-hour transcript reads only its header. Time lookups bisect the
+    start column and speaker lookups use the per-speaker index; text is decoded only
+    for the utterances asked for.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_size = _PREFIX.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} transcript store")
+        header = json.loads(self._map[_PREFIX.size:_PREFIX.size + header_size])
+        base = _align(_PREFIX.size + header_size)
+        view = memoryview(self._map)
+
+        self._views = [view]
+        self.columns = {}
+        for name, typecode in header['typecodes'].items():
+            offset, count = header['sections'][name]
+            start = base + offset
+            if header['byteorder'] == sys.byteorder and array.array(typecode).itemsize == header['itemsizes'][name]:
+                column = view[start:start + count * header['itemsizes'][name]].cast(typecode)
+                self._views.append(column)
+            else:
+                # Written on another platform: copy the column and fix its byte order
+                column = array.array(typecode, self._map[start:start + count * header['itemsizes'][name]])
+                if header['byteorder'] != sys.byteorder:
+                    column.byteswap()
+            self.columns[name] = column
+        offset, size = header['sections']['text']
+        self._text_base = base + offset
+        self.speakers = [speaker['name'] for speaker in header['speakers']]
+        self._speaker_table = {speaker['name']: speaker for speaker in header['speakers']}
+        self._count = header['utterances']
+
+    def __len__(self):
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for view in reversed(getattr(self, '_views', [])):
+            view.release()
+        self._views = []
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    @property
+    def duration(self):
+        """End of the last utterance in ms."""
+        return max(self.columns['end']) if self._count else 0
+
+    def text(self, i):
+        offsets = self.columns['text_offset']
+        return self._map[self._text_base + offsets[i]:self._text_base + offsets[i + 1] - 1].decode('utf-8')
+
+    def line(self, i):
+        """The utterance in the transcription.txt format."""
+        return f"Speaker {self.speakers[self.columns['speaker'][i]]}: {self.text(i)}"
+
+    def utterance(self, i):
+        return {'speaker': self.speakers[self.columns['speaker'][i]], 'text': self.text(i),
+                'start': self.columns['start'][i], 'end': self.columns['end'][i]}
+
+    def words(self, i):
+        """Word-level text and times of an utterance; empty when the source had no words."""
+        index, offsets = self.columns['word_index'], self.columns['word_offset']
+        words = []
+        for w in range(index[i], index[i + 1]):
+            text = self._map[self._text_base + offsets[w]:self._text_base + offsets[w + 1]].decode('utf-8').strip()
+            words.append({'text': text, 'start': self.columns['word_start'][w], 'end': self.columns['word_end'][w]})
+        return words
+
+    def find(self, time_ms):
+        """Index of the utterance being spoken at time_ms, or the next one after it."""
+        i = bisect.bisect_right(self.columns['start'], time_ms) - 1
+        if i >= 0 and self.columns['end'][i] > time_ms:
+            return i
+        return i + 1
+
+    def select(self, start_ms=None, end_ms=None, speaker=None):
+        """
+        Indices of the utterances that overlap [start_ms, end_ms) and belong to speaker.
+
+        Args:
+        - start_ms (int): Start of the range, or None for the beginning.
+        - end_ms (int): End of the range, or None for the end.
+        - speaker (str): Only this speaker's utterances, or None for all.
+
+        Returns:
+        - range or list: Utterance indices in order.
+        """
+        first = 0 if start_ms is None else self.find(start_ms)
+        last = self._count if end_ms is None else bisect.bisect_left(self.columns['start'], end_ms)
+        if speaker is None:
+            return range(first, max(first, last))
+        entry = self._speaker_table.get(str(speaker))
+        if entry is None:
+            return []
+        ids = self.columns['speaker_index'][entry['first']:entry['first'] + entry['count']]
+        return list(ids[bisect.bisect_left(ids, first):bisect.bisect_left(ids, last)])
+
+    def iter_lines(self, start_ms=None, end_ms=None, speaker=None):
+        """Yield the selected utterances as "Speaker X: text" lines, ending in a newline."""
+        for i in self.select(start_ms, end_ms, speaker):
+            yield self.line(i) + '\n'
+
+def read_text(path, start_ms=None, end_ms=None, speaker=None):
+    """
+    Read a transcript as text, from a store or a plain transcription.txt.
+
+    A range or speaker can only be selected from a store.
+    """
+    if is_store(path):
+        with TranscriptStore(path) as store:
+            return ''.join(store.iter_lines(start_ms, end_ms, speaker))
+    if start_ms is not None or end_ms is not None or speaker is not None:
+        raise ValueError(f"{path} is a plain transcript; a time range or speaker needs a transcript store")
+    with open(path, 'r') as file:
+        return file.read()
+
+def parse_time(value):
+    """Parse seconds, MM:SS or HH:MM:SS into ms."""
+    if value is None:
+        return None
+    seconds = 0.0
+    for part in value.split(':'):
+        seconds = seconds * 60 + float(part)
+    return int(seconds * 1000)
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or query a compact transcript store indexed by time and speaker.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Convert a transcription.txt or stitched utterances JSON into a store.')
+    build_parser.add_argument('input_file', help='"Speaker X: text" lines, or a JSON list of utterances with times.')
+    build_parser.add_argument('output_file', help='The store to write, e.g. transcription.v2st.')
+
+    query_parser = subparsers.add_parser('query', help='Print utterances from a store.')
+    query_parser.add_argument('store', help='The transcript store.')
+    query_parser.add_argument('--start', help='Start of the range, in seconds or [HH:]MM:SS.')
+    query_parser.add_argument('--end', help='End of the range, in seconds or [HH:]MM:SS.')
+    query_parser.add_argument('--speaker', help='Only this speaker.')
+    query_parser.add_argument('--times', action='store_true', help='Prefix each line with its start and end.')
+
+    info_parser = subparsers.add_parser('info', help='Show the size, duration and speakers of a store.')
+    info_parser.add_argument('store', help='The transcript store.')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        with open(args.input_file, 'r') as file:
+            if args.input_file.endswith('.json'):
+                utterances = json.load(file)
+            else:
+                utterances = list(parse_lines(file))
+        count = write_store(utterances, args.output_file)
+        print(f"Wrote {count} utterances to {args.output_file} ({os.path.getsize(args.output_file)} bytes).")
+        return
+
+    with TranscriptStore(args.store) as store:
+        if args.command == 'info':
+            print(f"{len(store)} utterances, {store.duration / 1000:.1f}s, speakers: {', '.join(store.speakers)}, "
+                  f"{os.path.getsize(args.store)} bytes")
+            return
+        for i in store.select(parse_time(args.start), parse_time(args.end), args.speaker):
+            if args.times:
+                print(f"[{store.columns['start'][i] / 1000:.2f}-{store.columns['end'][i] / 1000:.2f}] {store.line(i)}")
+            else:
+                print(store.line(i))
+
+if __name__ == '__main__':
+    main()
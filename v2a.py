@@ -2,123 +2,524 @@
 
 import os
 import subprocess
-import math
 import argparse
+import bisect
+import json
 import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+import metrics
 
-# Set up the command-line argument parser
-parser = argparse.ArgumentParser(description='Convert a video file to an MP3 file and split it into chunks if necessary.')
-parser.add_argument('-i', '--input', default='video.mp4', help='The input file to convert.')
-parser.add_argument('-o', '--output', default='output.mp3', help='The output file name.')
-parser.add_argument('-s', '--size', type=int, default=25, help='The maximum chunk size in MB.')
-parser.add_argument('-r', '--remove', action='store_true', help='Remove the original video file after conversion.')
-parser.add_argument('-l', '--log', help='The name of the log file.')
-args = parser.parse_args()
+# Define the output names and split settings
+chunk_output = 'split'
+manifest_file = f'{chunk_output}.json'
+overlap = 30
+silence_overlap = 2
+target_size = 26214400  # Target size in bytes
+bitrate_kbps = 32
+time_map_file = 'timemap.json'
 
-# Set up logging
-if args.log:
-    logging.basicConfig(filename=args.log, level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+# Encoder settings per output profile. 'transcription' keeps only what speech
+# recognition needs: one channel at 16 kHz, in Opus tuned for voice.
+PROFILES = {
+    'mp3': {'codec': 'libmp3lame', 'bitrate': bitrate_kbps, 'extension': 'mp3', 'args': []},
+    'transcription': {'codec': 'libopus', 'bitrate': 12, 'extension': 'opus',
+                      'args': ['-ac', '1', '-ar', '16000', '-application', 'voip']},
+}
+
+# Set by main() when a log file is requested
+log_file = None
 
 # Define a function to print messages and optionally log them
 def print_and_log(message, level='info'):
     print(message)
-    if args.log:
+    if log_file:
         if level == 'info':
             logging.info(message)
         elif level == 'error':
             logging.error(message)
 
-# Define the input and output files
-input_file = args.input
-output_file = args.output
-chunk_output = 'split'
-overlap = 30
-chunk_size = args.size * 1024  # Convert size from MB to KB
-target_size = 26214400  # Target size in bytes
+def probe_duration(input_file):
+    """Return the duration of a media file in seconds, as reported by ffprobe."""
+    return float(subprocess.check_output(['ffprobe', '-i', input_file, '-show_entries', 'format=duration', '-v', 'quiet', '-of', 'csv=p=0']))
 
-try:
-    print_and_log(f"Estimating size of {input_file}...")
+def plan_segment_duration(max_bytes, bitrate=bitrate_kbps, margin=0.97):
+    """
+    Compute the longest segment duration whose encoded size stays under max_bytes.
 
-    # Use ffmpeg to convert a 1 minute sample of the video to an MP3 audio file
-    subprocess.check_call(['ffmpeg', '-i', input_file, '-c:a', 'libmp3lame', '-b:a', '32k', '-t', '60', 'sample.mp3'])
+    Args:
+    - max_bytes (int): Maximum size of one segment in bytes.
+    - bitrate (int): Constant audio bitrate in kbit/s.
+    - margin (float): Fraction of the budget to use, leaving room for container headers.
 
-    # Get the size of the sample file in bytes
-    sample_size = os.path.getsize('sample.mp3')
+    Returns:
+    - float: Segment duration in seconds.
+    """
+    return max_bytes * 8 / (bitrate * 1000) * margin
 
-    # Get the duration of the video file in seconds
-    duration = float(subprocess.check_output(['ffprobe', '-i', input_file, '-show_entries', 'format=duration', '-v', 'quiet', '-of', 'csv=p=0']))
+def default_overlap(silence=False):
+    """Seconds of overlap between chunks: cuts at silences do not split words, so they only need a short one."""
+    return silence_overlap if silence else overlap
 
-    # Estimate the size of the full audio file based on the sample
-    estimated_size = (sample_size / 60) * duration
-    os.remove('sample.mp3')
+def codec_args(profile='mp3', bitrate=None):
+    """ffmpeg output options of a profile, with its bitrate unless one is given."""
+    settings = PROFILES[profile]
+    return ['-c:a', settings['codec'], '-b:a', f"{bitrate or settings['bitrate']}k"] + settings['args']
 
-    print_and_log(f"Estimated size of the output file: {estimated_size} bytes")
+def encode_audio(input_file, output_file, start=None, duration=None, bitrate=None, profile='mp3'):
+    """Encode the audio of input_file (optionally only a time range of it) with the settings of a profile."""
+    command = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error']
+    if start is not None:
+        # Seeking before -i makes ffmpeg decode only the requested range
+        command += ['-ss', str(start)]
+    if duration is not None:
+        command += ['-t', str(duration)]
+    command += ['-i', input_file, '-vn'] + codec_args(profile, bitrate) + [output_file]
+    with metrics.span('ffmpeg_encode', file=output_file, start=start, duration=duration) as span:
+        subprocess.check_call(command)
+        span.set(bytes=os.path.getsize(output_file))
+    return output_file
 
-    # Decide what to do based on the estimated size
-    if 0.9 * target_size <= estimated_size <= 1.1 * target_size:
-        print_and_log("Estimated size is within 10% of the target size. Adjusting compression level...")
-        # Adjust the bitrate based on the estimated size and reconvert the file
-        # This would require more complex logic that's beyond the scope of this example
-    elif estimated_size < 2 * target_size:
-        print_and_log("Estimated size is less than double the target size. Splitting the file into two chunks...")
-        chunk_duration = duration / 2
-    else:
-        print_and_log("Estimated size is more than double the target size. Splitting the file into multiple chunks...")
-        chunk_duration = (chunk_size * 8) / 32  # duration in seconds, we divide by the bitrate (32 kbit/s)
+def detect_silences(input_file, noise_db=-35, min_duration=0.5):
+    """
+    Find silent stretches with ffmpeg's silencedetect filter.
 
-    print_and_log(f"Preparing to convert {input_file} to MP3 format...")
+    Args:
+    - input_file (str): Media file to scan.
+    - noise_db (float): Level below which audio counts as silence, in dB.
+    - min_duration (float): Shortest silence to report, in seconds.
 
-    # Use ffmpeg to convert the video file to an MP3 audio file
-    subprocess.check_call(['ffmpeg', '-i', input_file, '-c:a', 'libmp3lame', '-b:a', '32k', output_file])
+    Returns:
+    - list: (start, end) pairs in seconds.
+    """
+    result = subprocess.run(['ffmpeg', '-hide_banner', '-nostats', '-i', input_file, '-vn',
+                             '-af', f'silencedetect=noise={noise_db}dB:d={min_duration}', '-f', 'null', '-'],
+                            capture_output=True, text=True, check=True)
+    silences = []
+    silence_start = None
+    for line in result.stderr.splitlines():
+        match = re.search(r'silence_start: (-?[\d.]+)', line)
+        if match:
+            silence_start = max(0.0, float(match.group(1)))
+            continue
+        match = re.search(r'silence_end: ([\d.]+)', line)
+        if match and silence_start is not None:
+            silences.append((silence_start, float(match.group(1))))
+            silence_start = None
+    return silences
 
-    print_and_log(f"Conversion complete! {output_file} has been created.")
+def plan_splits(duration, max_duration, overlap=overlap, silences=()):
+    """
+    Plan chunk boundaries so that every chunk, overlap included, lasts at most max_duration seconds.
 
-except subprocess.CalledProcessError as err:
-    print_and_log(f"ffmpeg command failed with error: {err}", 'error')
-    exit(1)
+    Each cut lands in the middle of the latest silence that fits in the second half of the
+    chunk, and falls back to the latest possible point when there is none. Every chunk
+    except the last runs overlap seconds past its cut.
 
-# Check if the output file exists
-if not os.path.isfile(output_file):
-    print_and_log(f"Error: {output_file} does not exist. Please check if the conversion process was successful.", 'error')
-    exit(1)
+    Returns:
+    - list: (start, end) pairs in seconds.
+    """
+    if duration <= max_duration:
+        return [(0.0, duration)]
 
-# Get the size of the file in bytes
-filesize = os.path.getsize(output_file)
+    overlap = min(overlap, max_duration / 2)
+    midpoints = sorted((start + end) / 2 for start, end in silences)
+    splits = []
+    start = 0.0
+    while start + max_duration < duration:
+        latest = start + max_duration - overlap
+        earliest = start + (max_duration - overlap) / 2
+        cut = latest
+        i = bisect.bisect_right(midpoints, latest)
+        if i and midpoints[i - 1] >= earliest:
+            cut = midpoints[i - 1]
+        splits.append((start, min(cut + overlap, duration)))
+        start = cut
+    splits.append((start, duration))
+    return splits
 
-# Convert the file size from bytes to megabytes
-filesizeMB = filesize / (1024 * 1024)
+def plan_chunks(input_file, max_bytes=target_size, bitrate=bitrate_kbps, overlap=overlap, silence=False):
+    """
+    Plan the chunks for input_file from its ffprobe duration and the constant bitrate, without a trial encode.
 
-print_and_log(f"Size of the output file: {filesizeMB:.2f} MB")
+    Returns:
+    - list: (start, end) pairs in seconds.
+    """
+    duration = probe_duration(input_file)
+    max_duration = plan_segment_duration(max_bytes, bitrate)
+    estimated_size = duration * bitrate * 1000 / 8
 
-# If the file is larger than the specified chunk size, split it into smaller chunks
-if filesize > target_size:
-    print_and_log("The output file is too large. Breaking it down into smaller chunks...")
+    print_and_log(f"Estimated size of the output file: {estimated_size:.0f} bytes")
+    if estimated_size <= max_bytes:
+        return [(0.0, duration)]
 
-    # Calculate the number of chunks
-    n = math.ceil(duration / chunk_duration)
+    silences = []
+    if silence:
+        print_and_log(f"Detecting silences in {input_file}...")
+        silences = detect_silences(input_file)
+        print_and_log(f"Found {len(silences)} silences.")
 
-    # Loop through each chunk
-    for i in range(n):
-        # Calculate the start time of the chunk
-        start = i * chunk_duration - overlap if i * chunk_duration - overlap > 0 else 0
+    splits = plan_splits(duration, max_duration, overlap, silences)
+    print_and_log(f"Planned {len(splits)} chunks of up to {max_duration:.0f} seconds with {overlap} seconds of overlap.")
+    return splits
 
-        try:
-            # Use ffmpeg to copy a chunk of the audio file to a new file
-            subprocess.check_call(['ffmpeg', '-hide_banner', '-loglevel', 'panic', '-i', output_file, '-c', 'copy', '-ss', str(start), '-t', str(chunk_duration), f"{chunk_output}_{i}.mp3"])
-            print_and_log(f"Chunk {i} has been created.")
+def write_manifest(files, splits, path=manifest_file):
+    """
+    Record where each chunk sits on the source timeline, so transcripts can be stitched back together.
+
+    Returns:
+    - list: The files, unchanged.
+    """
+    with open(path, 'w') as manifest:
+        json.dump([{"file": file, "start": start, "end": end} for file, (start, end) in zip(files, splits)], manifest, indent=2)
+    return files
+
+def convert_single_pass(input_file, output_file, max_bytes=target_size, bitrate=None, silence=False, profile='mp3'):
+    """
+    Decode the source once and write size-bounded segments directly with ffmpeg's segment muxer.
+
+    Segments written this way are contiguous; use convert_parallel when overlap between them is needed.
+
+    Returns:
+    - list: Paths of the files that were written.
+    """
+    bitrate = bitrate or PROFILES[profile]['bitrate']
+    extension = PROFILES[profile]['extension']
+    splits = plan_chunks(input_file, max_bytes, bitrate, overlap=0, silence=silence)
+
+    if len(splits) == 1:
+        print_and_log(f"Converting {input_file} to {output_file} in a single pass...")
+        return write_manifest([encode_audio(input_file, output_file, bitrate=bitrate, profile=profile)], splits)
+
+    cuts = ','.join(f"{start:.3f}" for start, _ in splits[1:])
+    print_and_log(f"Converting {input_file} into {len(splits)} segments in a single pass...")
+    files = [f"{chunk_output}_{i}.{extension}" for i in range(len(splits))]
+    with metrics.span('ffmpeg_encode', file=f"{chunk_output}_%d.{extension}", chunks=len(splits)) as span:
+        subprocess.check_call(['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error', '-i', input_file, '-vn']
+                              + codec_args(profile, bitrate)
+                              + ['-f', 'segment', '-segment_times', cuts, '-reset_timestamps', '1',
+                                 f"{chunk_output}_%d.{extension}"])
+        span.set(bytes=sum(os.path.getsize(path) for path in files))
+    return write_manifest(files, splits)
+
+def convert_parallel(input_file, output_file, max_bytes=target_size, jobs=os.cpu_count(), bitrate=None, overlap=overlap, silence=False, profile='mp3'):
+    """
+    Encode size-bounded, overlapping segments concurrently, one ffmpeg process per segment.
+
+    Each process seeks straight to its own range, so the source is still decoded only about once in total.
+
+    Returns:
+    - list: Paths of the files that were written.
+    """
+    bitrate = bitrate or PROFILES[profile]['bitrate']
+    splits = plan_chunks(input_file, max_bytes, bitrate, overlap, silence)
+
+    if len(splits) == 1:
+        print_and_log(f"Converting {input_file} to {output_file}...")
+        return write_manifest([encode_audio(input_file, output_file, bitrate=bitrate, profile=profile)], splits)
+
+    print_and_log(f"Encoding {len(splits)} segments of {input_file} with {jobs} parallel jobs...")
+
+    def encode(item):
+        i, (start, end) = item
+        path = encode_audio(input_file, f"{chunk_output}_{i}.{PROFILES[profile]['extension']}", start=start, duration=end - start,
+                            bitrate=bitrate, profile=profile)
+        print_and_log(f"Chunk {i} has been created.")
+        return path
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        return write_manifest(list(executor.map(metrics.propagate(encode), enumerate(splits))), splits)
+
+def plan_keep_ranges(duration, silences, min_silence=1.0, keep_silence=0.25):
+    """
+    Plan which parts of the source to keep when silence is removed.
+
+    Silences of at least min_silence seconds are cut down to keep_silence seconds on
+    either side of the cut, and leading and trailing silence is trimmed the same way,
+    so words next to a pause are never clipped.
+
+    Returns:
+    - list: (start, end) ranges of the source to keep, in seconds.
+    """
+    keep = []
+    position = 0.0
+    for start, end in silences:
+        if end - start < min_silence:
+            continue
+        cut_start = 0.0 if start <= 0 else start + keep_silence
+        cut_end = duration if end >= duration else end - keep_silence
+        if cut_end <= cut_start:
+            continue
+        if cut_start > position:
+            keep.append((position, cut_start))
+        position = max(position, cut_end)
+    if position < duration:
+        keep.append((position, duration))
+    return keep
+
+def build_time_map(keep, tempo=1.0):
+    """
+    Map processed-audio time back to source time.
+
+    Returns:
+    - dict: tempo and one {"start", "source_start", "source_end"} segment per kept range,
+      where start is the segment's position in the processed audio.
+    """
+    segments = []
+    position = 0.0
+    for source_start, source_end in keep:
+        segments.append({'start': round(position, 6), 'source_start': source_start, 'source_end': source_end})
+        position += (source_end - source_start) / tempo
+    return {'tempo': tempo, 'segments': segments}
+
+def to_source_time(time_map, seconds, starts=None):
+    """
+    Convert a time in the processed audio (seconds) to the matching time in the source.
+
+    Pass the segment starts as starts when converting many times with one map.
+    """
+    segments = time_map['segments']
+    if not segments:
+        return seconds
+    starts = starts if starts is not None else [segment['start'] for segment in segments]
+    segment = segments[max(0, bisect.bisect_right(starts, seconds) - 1)]
+    return min(segment['source_start'] + (seconds - segment['start']) * time_map['tempo'], segment['source_end'])
+
+def remap_utterances(utterances, time_map):
+    """Shift stitched utterances and their words (times in ms) from processed time to source time."""
+    starts = [segment['start'] for segment in time_map['segments']]
+
+    def convert(ms):
+        return to_source_time(time_map, ms / 1000, starts) * 1000
+
+    for utterance in utterances:
+        for word in utterance.get('words') or []:
+            word['start'], word['end'] = convert(word['start']), convert(word['end'])
+        utterance['start'], utterance['end'] = convert(utterance['start']), convert(utterance['end'])
+    return utterances
+
+def load_time_map(path=time_map_file):
+    with open(path, 'r') as file:
+        return json.load(file)
+
+def tempo_filters(tempo):
+    """atempo filters for a speed-up; each atempo instance is limited to 0.5-2.0."""
+    filters = []
+    while tempo > 2.0:
+        filters.append('atempo=2.0')
+        tempo /= 2.0
+    if abs(tempo - 1.0) > 1e-6:
+        filters.append(f'atempo={tempo:.6f}')
+    return filters
+
+def tempo_factor(value):
+    """argparse type for --tempo: a speed-up factor of at least 1.0."""
+    tempo = float(value)
+    if not tempo >= 1.0:
+        raise argparse.ArgumentTypeError(f"tempo must be at least 1.0 (a speed-up), got {value}")
+    return tempo
+
+def preprocess_for_transcription(input_file, output_file, trim_silence=False, tempo=1.0, noise_db=-35,
+                                 min_silence=1.0, keep_silence=0.25, time_map_path=time_map_file):
+    """
+    Prepare the audio for the 'transcription' profile, optionally without long silences and sped up.
+
+    The result is written losslessly (mono 16 kHz FLAC), so the audio is only encoded
+    lossily once, when convert_parallel() writes the Opus chunks from it. The time map
+    written to time_map_path converts transcript times back to the source (see
+    remap_utterances).
+
+    Args:
+    - input_file (str): The downloaded video or audio.
+    - output_file (str): The intermediate FLAC file.
+    - trim_silence (bool): Remove leading, trailing and long internal silences.
+    - tempo (float): Speed-up factor of at least 1.0, e.g. 1.25. Speech recognition copes well up to about 1.5.
+    - noise_db (float): Level below which audio counts as silence, in dB.
+    - min_silence (float): Shortest silence that is shortened, in seconds.
+    - keep_silence (float): Silence kept on either side of a cut, in seconds.
+    - time_map_path (str): Where to write the time map.
 
+    Returns:
+    - dict: file, source_seconds and processed_seconds, for report_savings().
+    """
+    if not tempo >= 1.0:
+        raise ValueError(f"tempo must be at least 1.0, got {tempo}")
+    duration = probe_duration(input_file)
+    keep = [(0.0, duration)]
+    if trim_silence:
+        print_and_log(f"Detecting silences in {input_file}...")
+        keep = plan_keep_ranges(duration, detect_silences(input_file, noise_db, min_silence), min_silence, keep_silence)
+    time_map = build_time_map(keep, tempo)
+
+    filters = []
+    if keep != [(0.0, duration)]:
+        selection = '+'.join(f'between(t,{start:.3f},{end:.3f})' for start, end in keep)
+        filters += [f"aselect='{selection}'", 'asetpts=N/SR/TB']
+    filters += tempo_filters(tempo)
+
+    command = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error', '-i', input_file, '-vn']
+    script = None
+    if filters:
+        # A long list of kept ranges can exceed the command-line limit, so pass the filter as a file
+        script = output_file + '.filter'
+        with open(script, 'w') as file:
+            file.write(','.join(filters))
+        command += ['-filter_script:a', script]
+    command += ['-c:a', 'flac', '-ac', '1', '-ar', '16000', output_file]
+    try:
+        with metrics.span('ffmpeg_encode', file=output_file, profile='transcription') as span:
+            subprocess.check_call(command)
+            span.set(bytes=os.path.getsize(output_file))
+    finally:
+        if script and os.path.exists(script):
+            os.remove(script)
+
+    with open(time_map_path, 'w') as file:
+        json.dump(time_map, file, indent=2)
+    return {'file': input_file, 'source_seconds': round(duration, 3),
+            'processed_seconds': round(sum(end - start for start, end in keep) / tempo, 3)}
+
+def report_savings(report, files, max_bytes=target_size):
+    """
+    Compare the uploaded chunks of the 'transcription' profile with what the MP3 profile would upload.
+
+    Args:
+    - report (dict): As returned by preprocess_for_transcription().
+    - files (list): The chunk files written by convert_parallel().
+    - max_bytes (int): Chunk size limit, used to count the chunks the MP3 profile would need.
+
+    Returns:
+    - dict: The report with bytes, chunk counts and savings added.
+    """
+    duration = report['source_seconds']
+    mp3_bytes = duration * PROFILES['mp3']['bitrate'] * 1000 / 8
+    uploaded = sum(os.path.getsize(path) for path in files)
+    report = dict(report,
+                  mp3_bytes=int(mp3_bytes),
+                  processed_bytes=uploaded,
+                  mp3_chunks=len(plan_splits(duration, plan_segment_duration(max_bytes, PROFILES['mp3']['bitrate']), 0)),
+                  processed_chunks=len(files),
+                  seconds_saved_percent=round(100 * (1 - report['processed_seconds'] / duration), 1) if duration else 0.0,
+                  bytes_saved_percent=round(100 * (1 - uploaded / mp3_bytes), 1) if mp3_bytes else 0.0)
+    print_and_log(f"{report['file']}: {duration / 60:.1f} -> {report['processed_seconds'] / 60:.1f} billed minutes "
+                  f"({report['seconds_saved_percent']}% saved), {report['mp3_bytes'] / 1e6:.1f} MB as MP3 -> "
+                  f"{uploaded / 1e6:.1f} MB ({report['bytes_saved_percent']}% saved), "
+                  f"{report['mp3_chunks']} -> {report['processed_chunks']} chunks.")
+    return report
+
+def convert_and_split(input_file, output_file, size=25, overlap=overlap, silence=False):
+    """Convert input_file to MP3, then split the result into the planned chunks if it is too large."""
+    max_bytes = size * 1024 * 1024
+
+    try:
+        print_and_log(f"Planning chunks for {input_file}...")
+        splits = plan_chunks(input_file, max_bytes, bitrate_kbps, overlap, silence)
+
+        print_and_log(f"Preparing to convert {input_file} to MP3 format...")
+
+        # Use ffmpeg to convert the video file to an MP3 audio file
+        subprocess.check_call(['ffmpeg', '-i', input_file, '-c:a', 'libmp3lame', '-b:a', f'{bitrate_kbps}k', output_file])
+
+        print_and_log(f"Conversion complete! {output_file} has been created.")
+
+    except subprocess.CalledProcessError as err:
+        print_and_log(f"ffmpeg command failed with error: {err}", 'error')
+        exit(1)
+
+    # Check if the output file exists
+    if not os.path.isfile(output_file):
+        print_and_log(f"Error: {output_file} does not exist. Please check if the conversion process was successful.", 'error')
+        exit(1)
+
+    # Get the size of the file in bytes
+    filesize = os.path.getsize(output_file)
+
+    # Convert the file size from bytes to megabytes
+    filesizeMB = filesize / (1024 * 1024)
+
+    print_and_log(f"Size of the output file: {filesizeMB:.2f} MB")
+
+    # If the file is larger than the specified chunk size, split it at the planned points
+    if len(splits) > 1:
+        print_and_log("The output file is too large. Breaking it down into smaller chunks...")
+
+        for i, (start, end) in enumerate(splits):
+            try:
+                # Use ffmpeg to copy a chunk of the audio file to a new file
+                subprocess.check_call(['ffmpeg', '-hide_banner', '-loglevel', 'panic', '-i', output_file, '-c', 'copy', '-ss', str(start), '-t', str(end - start), f"{chunk_output}_{i}.mp3"])
+                print_and_log(f"Chunk {i} has been created.")
+
+            except subprocess.CalledProcessError as err:
+                print_and_log(f"ffmpeg command failed with error: {err}", 'error')
+                exit(1)
+
+        write_manifest([f"{chunk_output}_{i}.mp3" for i in range(len(splits))], splits)
+
+    else:
+        print_and_log("The output file is already compressed enough. No further action is required.")
+        write_manifest([output_file], splits)
+
+def main():
+    global log_file
+
+    # Set up the command-line argument parser
+    parser = argparse.ArgumentParser(description='Convert a video file to an MP3 file and split it into chunks if necessary.')
+    parser.add_argument('-i', '--input', default='video.mp4', help='The input file to convert.')
+    parser.add_argument('-o', '--output', default='output.mp3', help='The output file name.')
+    parser.add_argument('-s', '--size', type=int, default=25, help='The maximum chunk size in MB.')
+    parser.add_argument('-r', '--remove', action='store_true', help='Remove the original video file after conversion.')
+    parser.add_argument('-l', '--log', help='The name of the log file.')
+    parser.add_argument('--single-pass', action='store_true', help='Decode the input once and write size-bounded segments directly (no overlap).')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Encode overlapping segments with this many parallel ffmpeg processes.')
+    parser.add_argument('--silence', action='store_true', help='Split chunks at detected silences instead of fixed durations.')
+    parser.add_argument('--overlap', type=float, default=None, help=f'Seconds of overlap between chunks. Defaults to {overlap}, or {silence_overlap} with --silence.')
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='mp3', help='Output profile; "transcription" writes mono 16 kHz Opus at a low bitrate.')
+    parser.add_argument('--trim_silence', action='store_true', help='With --profile transcription, remove leading, trailing and long internal silences.')
+    parser.add_argument('--tempo', type=tempo_factor, default=1.0, help='With --profile transcription, speed the audio up by this factor.')
+    args = parser.parse_args()
+
+    # Set up logging
+    log_file = args.log
+    if args.log:
+        logging.basicConfig(filename=args.log, level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+
+    chunk_overlap = args.overlap if args.overlap is not None else default_overlap(args.silence)
+
+    if args.profile == 'transcription':
+        max_bytes = args.size * 1024 * 1024
+        processed = 'processed.flac'
+        output = os.path.splitext(args.output)[0] + '.' + PROFILES['transcription']['extension']
+        try:
+            report = preprocess_for_transcription(args.input, processed, args.trim_silence, args.tempo)
+            # Chunk times in the manifest are on the processed timeline; timemap.json maps them back
+            files = convert_parallel(processed, output, max_bytes, jobs=args.jobs, overlap=chunk_overlap,
+                                     silence=args.silence, profile='transcription')
+            report_savings(report, files, max_bytes)
         except subprocess.CalledProcessError as err:
             print_and_log(f"ffmpeg command failed with error: {err}", 'error')
             exit(1)
+        print_and_log(f"Conversion complete! {len(files)} file(s) created: {', '.join(files)}")
+    elif args.jobs > 1 or args.single_pass:
+        max_bytes = args.size * 1024 * 1024
+        try:
+            if args.jobs > 1:
+                files = convert_parallel(args.input, args.output, max_bytes, jobs=args.jobs, overlap=chunk_overlap, silence=args.silence)
+            else:
+                files = convert_single_pass(args.input, args.output, max_bytes, silence=args.silence)
+        except subprocess.CalledProcessError as err:
+            print_and_log(f"ffmpeg command failed with error: {err}", 'error')
+            exit(1)
+        print_and_log(f"Conversion complete! {len(files)} file(s) created: {', '.join(files)}")
+    else:
+        convert_and_split(args.input, args.output, args.size, overlap=chunk_overlap, silence=args.silence)
 
-else:
-    print_and_log("The output file is already compressed enough. No further action is required.")
-
-# Remove the original video file if specified by the user
-if args.remove:
-    try:
-        os.remove(input_file)
-        print_and_log(f"Original video file {input_file} has been removed.")
-    except OSError as err:
-        print_and_log(f"Error removing original video file {input_file}: {err}", 'error')
+    # Remove the original video file if specified by the user
+    if args.remove:
+        try:
+            os.remove(args.input)
+            print_and_log(f"Original video file {args.input} has been removed.")
+        except OSError as err:
+            print_and_log(f"Error removing original video file {args.input}: {err}", 'error')
 
+if __name__ == '__main__':
+    main()
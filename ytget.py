@@ -1,6 +1,18 @@
 #!/usr/bin/python3
 import argparse
-from pytube import YouTube
+import json
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+import metrics
+from pytube import YouTube, request
+
+# Size of one byte range fetched by the parallel downloader
+PART_SIZE = 4 * 1024 * 1024
 
 def progress_function(stream, chunk, bytes_remaining):
     total_size = stream.filesize
@@ -12,7 +24,7 @@ def progress_function(stream, chunk, bytes_remaining):
 def complete_function(stream, file_path):
     print("\nDownload completed and saved to:", file_path)
 
-def download_video(url, output_filename=None, output_path='.'):
+def download_video(url, output_filename=None, output_path='.', connections=4):
     yt = YouTube(url)
     yt.register_on_progress_callback(progress_function)
     yt.register_on_complete_callback(complete_function)
@@ -27,16 +39,219 @@ def download_video(url, output_filename=None, output_path='.'):
         key=lambda x: x.resolution if x.resolution else "9999"
     )[0]
 
-    video.download(output_path, filename=output_filename)
+    return download_stream(video, output_path, output_filename, connections)
+
+def plan_parts(size, part_size=PART_SIZE):
+    """Split a file of the given size into inclusive (start, end) byte ranges."""
+    return [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+
+def load_progress(progress_file, size, part_size):
+    """Return the indices of the parts already written, or an empty set if the sidecar does not match."""
+    if not os.path.isfile(progress_file):
+        return set()
+    try:
+        with open(progress_file, 'r') as file:
+            progress = json.load(file)
+    except (OSError, ValueError):
+        return set()
+    if progress.get('size') != size or progress.get('part_size') != part_size:
+        return set()
+    return set(progress.get('done', []))
+
+def save_progress(progress_file, size, part_size, done):
+    # Write to a temporary file first so an interruption never leaves a truncated sidecar
+    with open(progress_file + '.tmp', 'w') as file:
+        json.dump({'size': size, 'part_size': part_size, 'done': sorted(done)}, file)
+    os.replace(progress_file + '.tmp', progress_file)
+
+def download_ranges(url, file_path, size, connections=4, part_size=PART_SIZE, on_progress=None, on_complete=None,
+                    max_retries=3, timeout=30):
+    """
+    Download a file in concurrent byte ranges, resuming an earlier interrupted download.
+
+    The data goes to file_path + '.part', preallocated to its full size, and every part is
+    written at its own offset. Finished parts are recorded in a sidecar file
+    (file_path + '.progress'), so a restarted download only fetches the parts that are
+    missing. Only a complete download is renamed to file_path, and the sidecar is then
+    removed.
+
+    Args:
+    - url (str): URL of the file. The server must support Range requests.
+    - file_path (str): Where to write the file.
+    - size (int): Size of the file in bytes.
+    - connections (int): Number of parts fetched at the same time, and size of the connection pool.
+    - part_size (int): Size of each byte range.
+    - on_progress (callable): Called as on_progress(chunk, bytes_remaining) after each write.
+    - on_complete (callable): Called as on_complete(file_path) when the download is finished.
+    - max_retries (int): Attempts per part before the download fails.
+    - timeout (float): Socket timeout in seconds.
+
+    Returns:
+    - str: file_path.
+    """
+    progress_file = file_path + '.progress'
+    part_path = file_path + '.part'
+    parts = plan_parts(size, part_size)
+
+    if os.path.isfile(file_path) and os.path.getsize(file_path) == size and not os.path.exists(part_path):
+        # Already downloaded completely: only a finished download is renamed to file_path
+        if on_complete:
+            on_complete(file_path)
+        return file_path
+
+    done = load_progress(progress_file, size, part_size) if os.path.isfile(part_path) else set()
+    # Record the (possibly empty) progress before touching the data file
+    save_progress(progress_file, size, part_size, done)
+    with open(part_path, 'r+b' if done else 'wb') as file:
+        file.truncate(size)
+
+    lock = threading.Lock()
+    bytes_remaining = size - sum(parts[i][1] - parts[i][0] + 1 for i in done)
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, connections))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    def fetch(index):
+        nonlocal bytes_remaining
+        start, end = parts[index]
+        for attempt in range(max_retries):
+            written = 0
+            try:
+                with session.get(url, headers={'Range': f"bytes={start}-{end}"}, stream=True, timeout=timeout) as response:
+                    response.raise_for_status()
+                    if response.status_code != 206 and (start, end) != (0, size - 1):
+                        raise IOError(f"Server ignored the Range header for bytes {start}-{end}")
+                    with open(part_path, 'r+b') as file:
+                        file.seek(start)
+                        for chunk in response.iter_content(chunk_size=64 * 1024):
+                            chunk = chunk[:end + 1 - start - written]
+                            if not chunk:
+                                break
+                            file.write(chunk)
+                            written += len(chunk)
+                            with lock:
+                                bytes_remaining -= len(chunk)
+                                if on_progress:
+                                    on_progress(chunk, bytes_remaining)
+                if written != end - start + 1:
+                    raise IOError(f"Short read for bytes {start}-{end}: got {written} bytes")
+                with lock:
+                    done.add(index)
+                    save_progress(progress_file, size, part_size, done)
+                return
+            except (requests.RequestException, IOError):
+                with lock:
+                    # The part is fetched again from its start
+                    bytes_remaining += written
+                if attempt == max_retries - 1:
+                    raise
+                time.sleep(2 ** attempt)
+
+    missing = [i for i in range(len(parts)) if i not in done]
+    with metrics.span('http_download', file=file_path, connections=connections, parts=len(missing)) as span:
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, connections)) as executor:
+                for _ in executor.map(metrics.propagate(fetch), missing):
+                    pass
+        finally:
+            session.close()
+            span.set(bytes=sum(parts[i][1] - parts[i][0] + 1 for i in missing if i in done))
+
+    os.replace(part_path, file_path)
+    os.remove(progress_file)
+    if on_complete:
+        on_complete(file_path)
+    return file_path
+
+def download_stream(stream, output_path='.', filename=None, connections=4):
+    """
+    Download a pytube stream with download_ranges, reporting progress through
+    progress_function and complete_function.
+
+    Returns:
+    - str: Path of the downloaded file.
+    """
+    os.makedirs(output_path, exist_ok=True)
+    file_path = os.path.join(output_path, filename or stream.default_filename)
+    return download_ranges(stream.url, file_path, stream.filesize, connections,
+                           on_progress=lambda chunk, remaining: progress_function(stream, chunk, remaining),
+                           on_complete=lambda path: complete_function(stream, path))
+
+def select_audio_stream(yt):
+    """Select the adaptive audio-only stream with the highest bitrate."""
+    return yt.streams.filter(only_audio=True, adaptive=True).order_by('abr').desc().first()
+
+def download_audio(url, output_filename=None, output_path='.', pipe=False, connections=4):
+    """
+    Download only the audio track of a YouTube video.
+
+    Args:
+    - url (str): The URL of the YouTube video.
+    - output_filename (str): Name of the output file. Defaults to the video title.
+    - output_path (str): Directory for the output file.
+    - pipe (bool): Fetch the stream over a single connection and pipe it into ffmpeg, which
+      copies the audio without re-encoding it into a Matroska audio file (.mka holds any
+      codec YouTube serves). Without it, the stream is saved as is with the parallel,
+      resumable download_stream.
+    - connections (int): Parallel ranged connections used when not piping.
+
+    Returns:
+    - str: Path of the written file.
+    """
+    yt = YouTube(url)
+    yt.register_on_progress_callback(progress_function)
+    yt.register_on_complete_callback(complete_function)
+
+    stream = select_audio_stream(yt)
+    if stream is None:
+        raise ValueError(f"No audio-only stream available for {url}")
+
+    if not pipe:
+        # If no output filename is given, use the video's title and the stream's extension
+        if not output_filename:
+            output_filename = f"{yt.title}.{stream.subtype}"
+        return download_stream(stream, output_path, output_filename, connections)
+
+    if not output_filename:
+        output_filename = yt.title + ".mka"
+    file_path = os.path.join(output_path, output_filename)
+
+    ffmpeg = subprocess.Popen(['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0', '-vn',
+                               '-c:a', 'copy', '-f', 'matroska', file_path], stdin=subprocess.PIPE)
+    with metrics.span('http_download', file=file_path, pipe=True, bytes=stream.filesize):
+        try:
+            bytes_remaining = stream.filesize
+            for chunk in request.stream(stream.url):
+                bytes_remaining -= len(chunk)
+                # on_progress writes the chunk to ffmpeg's stdin and reports progress
+                stream.on_progress(chunk, ffmpeg.stdin, bytes_remaining)
+            ffmpeg.stdin.close()
+        except BaseException:
+            ffmpeg.kill()
+            ffmpeg.wait()
+            raise
+        if ffmpeg.wait() != 0:
+            raise subprocess.CalledProcessError(ffmpeg.returncode, 'ffmpeg')
+
+    stream.on_complete(file_path)
+    return file_path
 
 def main():
     parser = argparse.ArgumentParser(description='Download YouTube video with specified output name.')
     parser.add_argument('url', help='The URL of the YouTube video.')
     parser.add_argument('-f', '--file', dest='output_filename', default=None, help='The desired output filename without extension. Defaults to the YouTube video title if not specified.')
     parser.add_argument('--output_path', default='.', help='The output path for the downloaded video.')
+    parser.add_argument('--audio-only', action='store_true', help='Download only the best audio stream instead of the video.')
+    parser.add_argument('--pipe', action='store_true', help='With --audio-only, pipe the download through ffmpeg into a Matroska audio file without re-encoding it.')
+    parser.add_argument('-c', '--connections', type=int, default=4, help='Number of parallel ranged connections.')
     args = parser.parse_args()
 
-    download_video(args.url, args.output_filename, args.output_path)
+    if args.audio_only:
+        download_audio(args.url, args.output_filename, args.output_path, pipe=args.pipe, connections=args.connections)
+    else:
+        download_video(args.url, args.output_filename, args.output_path, args.connections)
 
 if __name__ == '__main__':
     main()